@@ -0,0 +1,192 @@
+"""Throughput benchmarks for the scrapers against a local fake e621.
+
+Starts fake_e621.py on a free port, then runs the real command lines of
+get_chars.py, get_char_top_img.py and fix_missing_images.py as separate
+processes at every combination of dataset size and worker count. The
+E621_* environment variables point them at the fake server, lift the
+2 req/s politeness limit (unless --rps is given) and keep them out of the
+real response cache. Request spans are read back from each run's
+E621_METRICS_FILE (see metrics.py), and each process is reaped with os.wait4,
+so peak RSS is measured per run.
+
+    python benchmark.py --sizes 1000 5000 --workers 1 4 16 --latency 0.05 --throttle-rate 0.02
+"""
+
+import argparse
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from fake_e621 import DEFAULT_LATENCY, DEFAULT_MISSING_RATE, character_name
+from metrics import METRICS_FILE_ENV, percentile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = ["get_chars", "get_char_top_img", "fix_missing_images"]
+DEFAULT_SIZES = [1000, 5000]
+DEFAULT_WORKERS = [1, 4, 16]
+SERVER_START_TIMEOUT = 10  # seconds
+
+REPORT_FIELDS = ["script", "size", "workers", "seconds", "requests", "requests_per_s", "p50_ms", "p99_ms",
+                 "retries", "throttled", "peak_rss_mb", "exit_code"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/_stats") as response:
+        return json.load(response)
+
+
+def start_server(args, port):
+    command = [sys.executable, os.path.join(SCRIPTS_DIR, "fake_e621.py"), "--port", str(port),
+               "--tags", str(max(args.sizes) * 2), "--latency", str(args.latency),
+               "--throttle-rate", str(args.throttle_rate), "--missing-rate", str(args.missing_rate)]
+    if args.retry_after is not None:
+        command += ["--retry-after", str(args.retry_after)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            server_stats(base_url)
+            return server, base_url
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError("fake_e621.py did not start")
+            time.sleep(0.1)
+
+
+def write_inputs(workdir, size):
+    """characters.csv and a top_img.csv with every third URL missing, for `size` fake characters"""
+    characters_csv = os.path.join(workdir, f"characters_{size}.csv")
+    images_csv = os.path.join(workdir, f"top_img_{size}.csv")
+    with open(characters_csv, "w", newline="", encoding="utf-8") as chars, \
+            open(images_csv, "w", newline="", encoding="utf-8") as images:
+        chars_writer, images_writer = csv.writer(chars), csv.writer(images)
+        chars_writer.writerow(["name", "post_count"])
+        images_writer.writerow(["name", "image_url"])
+        for index in range(size):
+            name = character_name(index)
+            chars_writer.writerow([name, max(1, 200000 // (index + 1))])
+            images_writer.writerow([name, "" if index % 3 == 0 else f"https://static1.e621.net/data/{index}.png"])
+    return characters_csv, images_csv
+
+
+def command_for(script, size, workers, workdir, inputs):
+    """The command line a user would run for one benchmark case"""
+    characters_csv, images_csv = inputs
+    output = os.path.join(workdir, f"{script}_{size}_{workers}.csv")
+    path = os.path.join(SCRIPTS_DIR, f"{script}.py")
+    if script == "get_chars":
+        return [sys.executable, path, output, "--count", str(size), "--concurrency", str(workers), "--no-cache"]
+    if script == "get_char_top_img":
+        return [sys.executable, path, characters_csv, output, str(workers), "--no-cache"]
+    return [sys.executable, path, images_csv, output, str(workers), "--no-cache"]
+
+
+def run_case(script, size, workers, workdir, inputs, base_url, rps):
+    metrics_file = os.path.join(workdir, f"metrics_{script}_{size}_{workers}.jsonl")
+    env = dict(os.environ, E621_BASE_URL=base_url, E621_REQUESTS_PER_SECOND=str(rps or 0),
+               E621_CACHE_PATH=os.path.join(workdir, "cache.sqlite"), **{METRICS_FILE_ENV: metrics_file})
+    before = server_stats(base_url)
+
+    started = time.monotonic()
+    process = subprocess.Popen(command_for(script, size, workers, workdir, inputs), env=env, cwd=SCRIPTS_DIR,
+                               stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.monotonic() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    after = server_stats(base_url)
+    retries = 0
+    latencies = []
+    if os.path.exists(metrics_file):
+        with open(metrics_file, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("span") == "request":
+                    latencies.append(record["total_ms"] / 1000)
+                    retries += record["attempt"] > 0
+    requests = len(latencies)
+
+    p50, p99 = percentile(latencies, 0.50), percentile(latencies, 0.99)
+    return {
+        "script": script,
+        "size": size,
+        "workers": workers,
+        "seconds": round(seconds, 2),
+        "requests": requests,
+        "requests_per_s": round(requests / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(p50 * 1000, 1) if p50 is not None else "",
+        "p99_ms": round(p99 * 1000, 1) if p99 is not None else "",
+        "retries": retries,
+        "throttled": after["throttled"] - before["throttled"],
+        # ru_maxrss is in KiB on Linux (bytes on macOS)
+        "peak_rss_mb": round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "exit_code": process.returncode,
+    }
+
+
+def print_result(result):
+    print("  ".join(f"{field}={result[field]}" for field in REPORT_FIELDS), flush=True)
+
+
+def run(args):
+    results = []
+    port = args.port or free_port()
+    server, base_url = start_server(args, port)
+    try:
+        with tempfile.TemporaryDirectory(prefix="e621_bench_") as workdir:
+            print(f"Fake e621 at {base_url} (latency {args.latency}s, throttle {args.throttle_rate}, "
+                  f"missing {args.missing_rate}); work dir {workdir}")
+            for size in args.sizes:
+                inputs = write_inputs(workdir, size)
+                for script in args.scripts:
+                    for workers in args.workers:
+                        result = run_case(script, size, workers, workdir, inputs, base_url, args.rps)
+                        results.append(result)
+                        print_result(result)
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Results written to: {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against a local fake e621")
+    parser.add_argument("--scripts", nargs="+", choices=SCRIPTS, default=SCRIPTS, help="Scripts to benchmark (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help=f"Characters per dataset (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--workers", nargs="+", type=int, default=DEFAULT_WORKERS,
+                        help=f"Worker counts to try (default: {' '.join(map(str, DEFAULT_WORKERS))})")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help=f"Mean fake server latency in seconds (default: {DEFAULT_LATENCY})")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429 (default: 0)")
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with injected 429s (default: none)")
+    parser.add_argument("--missing-rate", type=float, default=DEFAULT_MISSING_RATE,
+                        help=f"Fraction of posts without a file.url (default: {DEFAULT_MISSING_RATE})")
+    parser.add_argument("--rps", type=float, help="Client requests-per-second budget (default: unlimited)")
+    parser.add_argument("--port", type=int, help="Port for the fake server (default: any free port)")
+    parser.add_argument("--output", help="Also write the results to this CSV")
+    args = parser.parse_args()
+
+    run(args)
@@ -0,0 +1,142 @@
+"""Append-only checkpoint journal for resumable image-URL refreshes.
+
+Each completed lookup is appended as one JSON line (name, image_url,
+post_count, fetched_at) and fsynced, either per line or by the row writer at
+short intervals, so an interrupted run loses almost no finished work.
+
+Loading the journal replays it into the latest record per tag, which is also
+what incremental refreshes compare against to decide whether a tag is
+missing, stale or has changed post count.
+"""
+
+import csv
+import json
+import os
+import time
+
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_COUNT_CHANGE = 0.10  # refresh when post_count moved by more than 10%
+
+
+def journal_path_for(output_csv):
+    return output_csv + ".journal"
+
+
+class CheckpointJournal:
+    """Append-only JSON-lines journal of completed tags"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def load(self):
+        """Replay the journal and return {name: latest record}"""
+        return {record["name"]: record for record in self.iter_records()}
+
+    def iter_records(self):
+        """Yield the journal's records in the order they were written, without holding them all"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A crash mid-write can leave a truncated last line
+                    continue
+
+    def open(self, truncate=False):
+        self._file = open(self.path, "w" if truncate else "a", encoding="utf-8")
+        return self
+
+    @property
+    def file(self):
+        return self._file
+
+    def append(self, name, image_url, post_count=None, fetched_at=None, sync=True, **extra):
+        """Append one completed tag; sync=False leaves fsyncing to the caller
+
+        Extra keyword fields (e.g. image_width/image_height) are stored as-is.
+        """
+        record = {
+            "name": name,
+            "image_url": image_url,
+            "post_count": post_count,
+            "fetched_at": fetched_at if fetched_at is not None else time.time(),
+            **extra,
+        }
+        self._file.write(json.dumps(record) + "\n")
+        if sync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return record
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def compact(self, records):
+        """Rewrite the journal with one line per tag"""
+        self.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records.values():
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def parse_int(value):
+    """int() that turns blanks and junk into None (post counts, ids, scores, dimensions)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def needs_refresh(row, record, max_age_days=DEFAULT_MAX_AGE_DAYS, count_change=DEFAULT_COUNT_CHANGE, now=None):
+    """Decide whether a character row has to be looked up again"""
+    if record is None or not record.get("image_url"):
+        return True
+    now = now if now is not None else time.time()
+    if now - record.get("fetched_at", 0) > max_age_days * 86400:
+        return True
+    old_count = record.get("post_count")
+    new_count = parse_int(row.get("post_count"))
+    if old_count and new_count is not None:
+        return abs(new_count - old_count) / old_count > count_change
+    return False
+
+
+def seed_from_csv(output_csv):
+    """Build journal records from an existing name,image_url CSV (first incremental run)"""
+    records = {}
+    if not os.path.exists(output_csv):
+        return records
+    # We don't know when these were fetched; the file's mtime is the best guess
+    fetched_at = os.path.getmtime(output_csv)
+    with open(output_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            records[row["name"]] = {
+                "name": row["name"],
+                "image_url": row.get("image_url", ""),
+                "post_count": None,
+                "fetched_at": fetched_at,
+                "image_width": parse_int(row.get("image_width")),
+                "image_height": parse_int(row.get("image_height")),
+            }
+    return records
+
+
+def write_csv_atomically(output_csv, header, rows):
+    """Write a CSV to a temp file and rename it over the target"""
+    tmp_path = output_csv + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_csv)
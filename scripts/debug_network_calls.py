@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
+import asyncio
 import csv
 import sys
-from fix_missing_images import find_top_image_url
 
-def debug_comparison(login=None, api_key=None):
+from e621_client import E621Client, find_top_image_url, tag_query
+from response_cache import ResponseCache
+
+async def debug_comparison(login=None, api_key=None, no_cache=False):
     """Debug comparison between a failing character and a working character"""
     
     # Find the first character with no image and the first with an image
@@ -35,8 +38,10 @@ def debug_comparison(login=None, api_key=None):
     print(f"\n🔴 TESTING FAILING CHARACTER: {failing_character}")
     print("=" * 80)
     
-    failing_tag_query = failing_character.replace(" ", "_")
-    failing_result = find_top_image_url(failing_tag_query, debug=True, login=login, api_key=api_key)
+    failing_tag_query = tag_query(failing_character)
+    async with E621Client(login=login, api_key=api_key, concurrency=1,
+                           cache=ResponseCache(), bypass_cache=no_cache) as client:
+        failing_result = await find_top_image_url(client, failing_tag_query, max_retries=3, debug=True)
     
     print(f"\n🔴 FINAL RESULT for {failing_character}: {failing_result}")
     print("=" * 80)
@@ -48,8 +53,10 @@ def debug_comparison(login=None, api_key=None):
     print(f"🟢 EXISTING URL: {working_url}")
     print("=" * 80)
     
-    working_tag_query = working_character.replace(" ", "_")
-    working_result = find_top_image_url(working_tag_query, debug=True, login=login, api_key=api_key)
+    working_tag_query = tag_query(working_character)
+    async with E621Client(login=login, api_key=api_key, concurrency=1,
+                           cache=ResponseCache(), bypass_cache=no_cache) as client:
+        working_result = await find_top_image_url(client, working_tag_query, max_retries=3, debug=True)
     
     print(f"\n🟢 FINAL RESULT for {working_character}: {working_result}")
     print("=" * 80)
@@ -73,12 +80,16 @@ if __name__ == "__main__":
     login = None
     api_key = None
     
-    if len(sys.argv) >= 3:
-        login = sys.argv[1]
-        api_key = sys.argv[2]
-    elif len(sys.argv) == 2:
+    # --no-cache skips cached responses (fresh answers are still written back)
+    no_cache = "--no-cache" in sys.argv
+    argv = [arg for arg in sys.argv if arg != "--no-cache"]
+    
+    if len(argv) >= 3:
+        login = argv[1]
+        api_key = argv[2]
+    elif len(argv) == 2:
         print("Error: If providing login, you must also provide api_key")
-        print("Usage: python debug_network_calls.py [login] [api_key]")
+        print("Usage: python debug_network_calls.py [login] [api_key] [--no-cache]")
         sys.exit(1)
     
     if login and api_key:
@@ -86,4 +97,4 @@ if __name__ == "__main__":
     else:
         print("No login credentials provided - testing without authentication")
     
-    debug_comparison(login, api_key)
+    asyncio.run(debug_comparison(login, api_key, no_cache))
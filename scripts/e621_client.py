@@ -0,0 +1,390 @@
+"""Shared asyncio client for the e621.net JSON API.
+
+Every data collection script goes through this module so that all requests
+share one pooled keep-alive session, a concurrency limit and a global
+requests-per-second budget.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+from image_selection import DEFAULT_CANDIDATES, DEFAULT_POLICY
+from metrics import get_metrics
+from rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+
+# The E621_* environment variables point every script at a stand-in server
+# (see fake_e621.py / benchmark.py) without touching their command lines
+BASE_URL = os.environ.get("E621_BASE_URL", "https://e621.net")
+USER_AGENT = "YourProject/1.0 (by yourusername on e621)"  # Must set a custom User-Agent
+SPACE = " "
+
+DEFAULT_CONCURRENCY = 10
+DEFAULT_REQUESTS_PER_SECOND = float(os.environ.get("E621_REQUESTS_PER_SECOND", 2.0))  # e621 asks for <= 2 req/s
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BATCH_SIZE = 20  # character tags per OR-query; e621 caps a search at 40 tags
+MAX_POSTS_PER_PAGE = 320
+REQUEST_TIMEOUT = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class E621Error(Exception):
+    """Raised when the e621 API returns something we can't use"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _stamp(key):
+    async def hook(session, trace_config_ctx, params):
+        if trace_config_ctx.trace_request_ctx is not None:
+            trace_config_ctx.trace_request_ctx[key] = time.monotonic()
+    return hook
+
+
+def timing_trace_config():
+    """aiohttp hooks that stamp connection phases into the dict passed as trace_request_ctx"""
+    config = aiohttp.TraceConfig()
+    config.on_connection_queued_start.append(_stamp("queued_start"))
+    config.on_connection_queued_end.append(_stamp("queued_end"))
+    config.on_dns_resolvehost_start.append(_stamp("dns_start"))
+    config.on_dns_resolvehost_end.append(_stamp("dns_end"))
+    config.on_connection_create_start.append(_stamp("connect_start"))
+    config.on_connection_create_end.append(_stamp("connect_end"))
+    config.on_request_end.append(_stamp("headers"))  # fires once the response headers are in
+    return config
+
+
+def request_phases(stamps, started, finished):
+    """Seconds spent in each phase of one request; None for phases a reused connection skipped"""
+    def between(start, end):
+        return stamps[end] - stamps[start] if start in stamps and end in stamps else None
+
+    return {
+        "queued": between("queued_start", "queued_end"),
+        "dns": between("dns_start", "dns_end"),
+        "connect": between("connect_start", "connect_end"),
+        "ttfb": stamps["headers"] - started if "headers" in stamps else None,
+        "total": finished - started,
+    }
+
+
+class E621Client:
+    """Pooled, rate-limited async client for posts.json and tags.json
+
+    Use as an async context manager so the underlying session is closed:
+
+        async with E621Client(concurrency=10) as client:
+            url = await find_top_image_url(client, "renamon")
+    """
+
+    def __init__(self, login=None, api_key=None, concurrency=DEFAULT_CONCURRENCY,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND, base_url=BASE_URL,
+                 max_retries=DEFAULT_MAX_RETRIES, cache=None, bypass_cache=False, metrics=None):
+        if (login and not api_key) or (api_key and not login):
+            raise ValueError("Both login and api_key must be provided together")
+        self.login = login
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.retries = 0
+        # Per-request spans and outcome counters (see metrics.py)
+        self.metrics = metrics or get_metrics()
+        # Optional ResponseCache; the client closes it on exit. With bypass_cache
+        # every request goes to the network, but fresh answers are still stored.
+        self.cache = cache
+        self.bypass_cache = bypass_cache
+        self._session = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(requests_per_second) if requests_per_second else None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        auth = aiohttp.BasicAuth(self.login, self.api_key) if self.login else None
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": USER_AGENT},
+            auth=auth,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            trace_configs=[timing_trace_config()],
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            raise RuntimeError("E621Client must be used inside 'async with'")
+        return self._session
+
+    async def get_json(self, endpoint, params=None):
+        """GET an API endpoint (e.g. "posts.json") and return the decoded JSON body
+
+        429s, 5xx responses and connection errors are retried with jittered
+        exponential backoff. A Retry-After header pauses the shared token bucket,
+        so every worker backs off together instead of hammering the API.
+
+        With a cache attached, fresh entries are returned without touching the
+        network and stale ones are revalidated with a conditional request.
+        """
+        url = f"{self.base_url}/{endpoint}"
+        cache_key = entry = None
+        headers = {}
+        if self.cache is not None:
+            cache_key = self.cache.key(endpoint, params, identity=self.login)
+            entry = None if self.bypass_cache else self.cache.get(cache_key)
+            if entry is not None:
+                if self.cache.is_fresh(entry):
+                    self.cache.hits += 1
+                    self.metrics.incr("cache.hit")
+                    return json.loads(entry.body)
+                if entry.etag:
+                    headers["If-None-Match"] = entry.etag
+                if entry.last_modified:
+                    headers["If-Modified-Since"] = entry.last_modified
+
+        attempt = 0
+        while True:
+            retry_after = None
+            async with self._semaphore:
+                if self._bucket is not None:
+                    await self._bucket.acquire()
+                stamps = {}
+                status = None
+                started = time.monotonic()
+                try:
+                    async with self.session.get(url, params=params, headers=headers,
+                                                trace_request_ctx=stamps) as response:
+                        status = response.status
+                        if response.status == 304 and entry is not None:
+                            self.cache.touch(cache_key)
+                            self.cache.revalidated += 1
+                            self.metrics.observe("request.retries", attempt)
+                            return json.loads(entry.body)
+                        if response.status == 200:
+                            body = await response.read()
+                            try:
+                                data = json.loads(body)
+                            except ValueError:
+                                # A proxy or challenge page; retried like a dropped connection
+                                # and never cached
+                                error = E621Error(f"HTTP 200 with a non-JSON body ({response.content_type})")
+                            else:
+                                if self.cache is not None:
+                                    self.cache.misses += 1
+                                    self.cache.put(cache_key, body, response.headers.get("ETag"),
+                                                   response.headers.get("Last-Modified"))
+                                self.metrics.observe("request.retries", attempt)
+                                return data
+                        else:
+                            error = E621Error(f"HTTP {response.status}", status=response.status)
+                            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                finally:
+                    self.metrics.incr(f"http.{status if status is not None else 'error'}")
+                    self.metrics.span("request", request_phases(stamps, started, time.monotonic()),
+                                      endpoint=endpoint, status=status, attempt=attempt)
+
+            status = getattr(error, "status", None)
+            if (status is not None and status not in RETRY_STATUSES) or attempt >= self.max_retries:
+                self.metrics.observe("request.retries", attempt)
+                raise error
+
+            if status == 429 and self._bucket is not None:
+                # Assume the whole budget is exhausted, not just this request's share
+                self._bucket.pause(retry_after if retry_after is not None else backoff_delay(attempt))
+            self.retries += 1
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    async def search_posts(self, tags, limit=10, page=1):
+        """Return the posts matching a list of search tags"""
+        params = {
+            "tags": SPACE.join(tags),
+            "limit": limit,
+            "page": page,
+        }
+        data = await self.get_json("posts.json", params)
+        return data.get("posts", [])
+
+    async def list_tags(self, category=4, order="count", limit=320, page=1):
+        """Return one page of tags.json (category 4 is character tags)
+
+        `page` may be a number or a "b<id>" cursor; cursors only make sense
+        with order=None (e621's default, newest id first).
+        """
+        params = {
+            "search[category]": category,
+            "limit": limit,
+            "page": page,
+        }
+        if order is not None:
+            params["search[order]"] = order
+        data = await self.get_json("tags.json", params)
+        # tags.json returns {"tags": []} instead of an empty list when nothing matches
+        return data if isinstance(data, list) else []
+
+
+def tag_query(name):
+    """Character names are stored with spaces in places; e621 tags use underscores"""
+    return name.replace(" ", "_")
+
+
+def no_image_outcome(posts):
+    """Counter name for a lookup that found no usable image"""
+    if not posts:
+        return "lookup.no_posts"
+    if all(not (post.get("file") or {}).get("url") for post in posts):
+        return "lookup.login_required"  # e621 blanks file.url on login-only posts
+    return "lookup.no_image"
+
+
+async def find_image_candidates(client, tag_name, limit=DEFAULT_CANDIDATES, max_retries=1, debug=False,
+                                policy=DEFAULT_POLICY):
+    """Query e621 for the best images of a tag's highest-scored, non-animated posts
+
+    Returns up to `limit` image_selection.Candidates (url, width, height,
+    size, ...) from different posts, best first, or an empty list. HTTP and
+    connection errors are already retried inside the client; `max_retries`
+    only re-asks when no post had a usable image. The outcome is counted in
+    client.metrics; `debug` adds a readable trace on stdout.
+    """
+    tags = [tag_name, "order:score", "-animated"]
+    if debug:
+        print(f"\n--- DEBUG: Querying {tag_name} ---")
+        print(f"Query tags: {SPACE.join(tags)}")
+
+    for attempt in range(max_retries):
+        try:
+            posts = await client.search_posts(tags, limit=10)  # Get more posts to check for valid URLs
+        except E621Error as e:
+            client.metrics.event("lookup.http_error", tag=tag_name, status=e.status)
+            if debug:
+                print(f"Error fetching post for {tag_name}: {e}")
+            return []
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            client.metrics.event("lookup.exception", tag=tag_name, error=repr(e))
+            if debug:
+                print(f"Error fetching post for {tag_name}: {e or type(e).__name__}")
+            return []
+
+        if debug:
+            print(f"Posts array length: {len(posts)}")
+            for i, post in enumerate(posts):
+                file_info = post.get("file") or {}
+                print(f"  Post {i + 1}/{len(posts)} ({post.get('id', 'no_id')}): {file_info.get('url') or 'no URL (likely login required)'}")
+
+        candidates = policy.choose_many(posts, limit)
+        if candidates:
+            client.metrics.incr("lookup.ok")
+            if debug:
+                print(f"Selected {candidates[0].rendition} of post {candidates[0].post_id}: {candidates[0].url} "
+                      f"({len(candidates) - 1} fallbacks)")
+            return candidates
+
+        if debug:
+            print(f"No usable images found in {len(posts)} posts for {tag_name}")
+        if attempt < max_retries - 1:
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        client.metrics.event(no_image_outcome(posts), tag=tag_name, posts=len(posts))
+        return []
+
+    return []
+
+
+async def find_top_image(client, tag_name, max_retries=1, debug=False, policy=DEFAULT_POLICY):
+    """Like find_image_candidates, but just the best Candidate (or None)"""
+    candidates = await find_image_candidates(client, tag_name, 1, max_retries, debug, policy)
+    return candidates[0] if candidates else None
+
+
+async def find_top_image_url(client, tag_name, max_retries=1, debug=False, policy=DEFAULT_POLICY):
+    """Like find_top_image, but just the URL ("" when there is none)"""
+    candidate = await find_top_image(client, tag_name, max_retries, debug, policy)
+    return candidate.url if candidate is not None else ""
+
+
+async def find_candidates(client, tag_names, limit=DEFAULT_CANDIDATES, debug=False, policy=DEFAULT_POLICY):
+    """Look up image candidates for several tags with a single OR-query
+
+    Posts come back in score order, so the first post with a usable image
+    tagged with a character is that character's top post, the same one a
+    per-tag query would find, and the next ones are its runners-up. When the
+    page was full, tags that got fewer than `limit` candidates may have been
+    crowded out by higher-scored characters, so they are asked again in
+    batches half the size (down to per-tag queries). Tags the batch didn't
+    cover at all (or every post needs login) fall back to per-tag queries.
+    Returns {tag_name: [Candidate, ...]}, best first; the list is empty when
+    nothing usable was found.
+    """
+    if len(tag_names) == 1:
+        return {tag_names[0]: await find_image_candidates(client, tag_names[0], limit, debug=debug, policy=policy)}
+
+    images = {}
+    tags = [f"~{tag_name}" for tag_name in tag_names] + ["order:score", "-animated"]
+    try:
+        posts = await client.search_posts(tags, limit=MAX_POSTS_PER_PAGE)
+    except (E621Error, aiohttp.ClientError, asyncio.TimeoutError) as e:
+        client.metrics.event("batch.failed", tags=len(tag_names), error=repr(e))
+        if debug:
+            print(f"Error fetching batch of {len(tag_names)} tags, falling back to per-tag queries: {e or type(e).__name__}")
+        posts = []
+
+    wanted = set(tag_names)
+    for post in posts:
+        candidate = policy.best(post)
+        if candidate is None:
+            continue
+        for character in (post.get("tags") or {}).get("character", []):
+            if character in wanted:
+                found = images.setdefault(character, [])
+                if len(found) < limit:
+                    found.append(candidate)
+
+    missing = [tag_name for tag_name in tag_names if tag_name not in images]
+    # A page that wasn't full held every matching post, so a short list is all there is
+    short = [tag_name for tag_name in tag_names
+             if len(posts) >= MAX_POSTS_PER_PAGE and 0 < len(images.get(tag_name, ())) < limit]
+    client.metrics.incr("lookup.ok", len(images) - len(short))
+    client.metrics.incr("batch.fallback", len(missing))
+    client.metrics.incr("batch.requery", len(short))
+    if debug:
+        print(f"Batch of {len(tag_names)} tags: {len(posts)} posts covered {len(images)}, {len(short)} short of "
+              f"{limit} candidates, {len(missing)} need per-tag queries")
+    fallback = await asyncio.gather(*(find_image_candidates(client, tag_name, limit, debug=debug, policy=policy)
+                                      for tag_name in missing))
+    images.update(zip(missing, fallback))
+
+    size = max(1, len(tag_names) // 2)
+    requeried = await asyncio.gather(*(find_candidates(client, short[i:i + size], limit, debug, policy)
+                                       for i in range(0, len(short), size)))
+    for found in requeried:
+        for tag_name, candidates in found.items():
+            # A failed re-query keeps what the first batch found
+            if len(candidates) > len(images[tag_name]):
+                images[tag_name] = candidates
+    return images
+
+
+async def find_top_images(client, tag_names, debug=False, policy=DEFAULT_POLICY):
+    """Like find_candidates, but {tag_name: best Candidate or None}"""
+    candidates = await find_candidates(client, tag_names, 1, debug, policy)
+    return {tag_name: found[0] if found else None for tag_name, found in candidates.items()}
@@ -0,0 +1,317 @@
+"""Export pre-generated round sequences as static JSON shards.
+
+Every /api/get-round is a database hit, and the frontend can only prefetch
+one round ahead. This batch job draws whole sequences from the pools
+load_db.py builds (round_pool for plain random rounds, round_pairs for
+easy/medium/hard) and writes them as compact JSON files that express.static
+or a CDN can serve, so most rounds never touch SQLite:
+
+    rounds/manifest.json                      what exists, re-read by clients
+    rounds/daily/2026-10-17.<hash>.json       one 50-round daily challenge per day
+    rounds/endless/<pool>/<n>.<hash>.json     shuffled endless shards per pool
+
+A shard holds each of its characters once, as the API returns them (image
+URLs and fallback_images included), and its rounds as pairs of indices into
+that list. Shard names carry a hash of their content, so they can be cached
+forever; only the manifest has to be revalidated. A daily challenge is seeded
+by its date and ramps from easy to hard, and once exported it is kept as is
+so a re-run later in the day doesn't change it under players. Files that
+neither the new manifest nor the previous one refer to are removed.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from load_db import CANDIDATES_TABLE, DEFAULT_DB_PATH, POOL_TABLE, REPO_ROOT, TABLE, connect
+from round_pairs import DIFFICULTIES, PAIRS_TABLE
+
+DEFAULT_OUT_DIR = os.path.join(REPO_ROOT, "rounds")
+MANIFEST = "manifest.json"
+DEFAULT_DAILY_ROUNDS = 50
+DEFAULT_DAYS = 7  # today and the next six, so a late re-run never leaves a day without a challenge
+DEFAULT_SHARD_SIZE = 100
+DEFAULT_SHARDS = 20  # per endless pool
+ANY_POOL = "any"
+POOLS = [ANY_POOL] + [name for name, _, _ in DIFFICULTIES]
+DAILY_RAMP = [name for name, _, _ in reversed(DIFFICULTIES)]  # easy, medium, hard
+CHARACTER_FIELDS = ["id", "name", "post_count", "image_url", "local_image", "image_width", "image_height"]
+
+
+def read_any_pool(conn):
+    """round_pool as (character ids, group starts, group sizes) arrays in slot order"""
+    rows = conn.execute(f"SELECT character_id, group_start, group_size FROM {POOL_TABLE} ORDER BY slot").fetchall()
+    columns = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return columns[:, 0], columns[:, 1], columns[:, 2]
+
+
+def read_pair_pools(conn):
+    """{difficulty: (k, 2) array of character ids} from round_pairs, in slot order"""
+    pools = {}
+    for name, _, _ in DIFFICULTIES:
+        rows = conn.execute(f"SELECT character_a, character_b FROM {PAIRS_TABLE} WHERE difficulty = ? ORDER BY slot",
+                            (name,)).fetchall()
+        pools[name] = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    return pools
+
+
+def random_rounds(pool, count, rng):
+    """`count` plain random rounds, as /api/get-round picks them: two slots with different post counts"""
+    ids, group_start, group_size = pool
+    if not len(ids):
+        return np.empty((0, 2), dtype=np.int64)
+    first = rng.integers(0, len(ids), size=count)
+    others = len(ids) - group_size[first]
+    first, others = first[others > 0], others[others > 0]
+    second = (rng.random(len(first)) * others).astype(np.int64)
+    second += np.where(second >= group_start[first], group_size[first], 0)
+    return np.stack([ids[first], ids[second]], axis=1)
+
+
+def shuffled_pairs(pairs, count, rng):
+    """`count` pairs drawn from a pool without repeats until it runs out, then from a fresh shuffle"""
+    if not len(pairs):
+        return pairs
+    passes = -(-count // len(pairs))
+    return np.concatenate([pairs[rng.permutation(len(pairs))] for _ in range(passes)])[:count]
+
+
+def pick_rounds(drawn, want, seen, played):
+    """Up to `want` pairs from `drawn` that weren't played yet, preferring characters not seen yet
+
+    Updates `seen` (character ids) and `played` (frozensets of both ids).
+    """
+    picked = []
+    # Small pools: repeat characters rather than come up short, but never a whole round
+    for fresh_only in (True, False):
+        for pair in drawn:
+            if len(picked) == want:
+                return picked
+            if frozenset(pair) in played or (fresh_only and seen.intersection(pair)):
+                continue
+            picked.append(pair)
+            seen.update(pair)
+            played.add(frozenset(pair))
+    return picked
+
+
+def daily_rounds(pools, any_pool, rounds, seed, day):
+    """One day's challenge: the same rounds for everyone, easy first and hard last
+
+    Characters aren't repeated within a day while the pools allow it, and
+    rounds never are. A difficulty without enough pairs is topped up with
+    plain random rounds. Returns (pairs, difficulty of each pair).
+    """
+    digest = hashlib.sha256(f"{seed}/{day.isoformat()}".encode()).digest()
+    rng = np.random.default_rng(int.from_bytes(digest[:8], "big"))
+    pairs, difficulties, seen, played = [], [], set(), set()
+    for index, name in enumerate(DAILY_RAMP):
+        want = rounds * (index + 1) // len(DAILY_RAMP) - len(pairs)
+        pool = pools.get(name)
+        picked = []
+        if pool is not None and len(pool):
+            picked = pick_rounds(pool[rng.permutation(len(pool))].tolist(), want, seen, played)
+            pairs += picked
+            difficulties += [name] * len(picked)
+        if len(picked) < want:
+            short = want - len(picked)
+            extra = pick_rounds(random_rounds(any_pool, short * 4, rng).tolist(), short, seen, played)
+            pairs += extra
+            difficulties += [ANY_POOL] * len(extra)
+    return pairs, difficulties
+
+
+def read_characters(conn, ids):
+    """{id: character dict} as /api/get-round returns them, for the given ids"""
+    ids = sorted(ids)
+    characters = {}
+    fallbacks = {}
+    has_candidates = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (CANDIDATES_TABLE,)).fetchone()
+    # Chunked to stay under SQLite's bound-parameter limit
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(f"SELECT {', '.join(CHARACTER_FIELDS)} FROM {TABLE} WHERE id IN ({placeholders})",
+                                chunk):
+            # Nulls are left out; the frontend treats a missing field the same way
+            characters[row[0]] = {field: value for field, value in zip(CHARACTER_FIELDS, row) if value is not None}
+        if has_candidates:
+            for character_id, url in conn.execute(
+                    f"SELECT i.character_id, i.url FROM {CANDIDATES_TABLE} i JOIN {TABLE} c ON c.id = i.character_id "
+                    f"WHERE i.character_id IN ({placeholders}) AND i.url IS NOT c.image_url "
+                    f"ORDER BY i.character_id, i.rank", chunk):
+                fallbacks.setdefault(character_id, []).append(url)
+    for character_id, urls in fallbacks.items():
+        characters[character_id]["fallback_images"] = urls
+    return characters
+
+
+def shard(pairs, characters, **extra):
+    """A shard body: each character once, rounds as index pairs into that list"""
+    index = {}
+    rounds = [[index.setdefault(a, len(index)), index.setdefault(b, len(index))] for a, b in pairs]
+    return {**extra, "characters": [characters[character_id] for character_id in index], "rounds": rounds}
+
+
+def write_shard(out_dir, stem, body):
+    """Write body as compact JSON under a content-hashed name; returns its path relative to out_dir"""
+    data = json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    relative = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}.json"
+    path = os.path.join(out_dir, *relative.split("/"))
+    if not os.path.exists(path):
+        write_atomically(path, data)
+    return relative
+
+
+def write_atomically(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def manifest_files(manifest):
+    return set(manifest.get("daily", {}).values()) | {path for paths in manifest.get("endless", {}).values()
+                                                      for path in paths}
+
+
+def prune(out_dir, keep):
+    """Remove shard files that no manifest in `keep` refers to; returns how many"""
+    removed = 0
+    for subdir in ("daily", "endless"):
+        for root, _, files in os.walk(os.path.join(out_dir, subdir)):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if os.path.relpath(path, out_dir).replace(os.sep, "/") not in keep:
+                    os.remove(path)
+                    removed += 1
+    return removed
+
+
+def run(db_path=DEFAULT_DB_PATH, out_dir=DEFAULT_OUT_DIR, daily_rounds_count=DEFAULT_DAILY_ROUNDS, days=DEFAULT_DAYS,
+        shard_size=DEFAULT_SHARD_SIZE, shards=DEFAULT_SHARDS, seed=0, start=None, rebuild_daily=False):
+    """Export daily challenges and endless shards from db_path into out_dir; returns the manifest"""
+    if np is None:
+        # The frontend falls back to /api/get-round when there is no manifest
+        print("NumPy is not installed; can't export rounds (pip install -r scripts/requirements.txt)")
+        return None
+    started = time.perf_counter()
+    start = start or datetime.date.today()
+    rng = np.random.default_rng(None)
+
+    conn = connect(db_path)
+    try:
+        try:
+            any_pool = read_any_pool(conn)
+            pools = read_pair_pools(conn)
+        except sqlite3.OperationalError:
+            print(f"No round pools in {db_path}; load it with load_db.py first")
+            return None
+        if len(any_pool[0]) < 2:
+            print(f"Not enough characters in {db_path} to export rounds")
+            return None
+
+        previous = read_manifest(out_dir)
+        schedules = {}
+        for offset in range(days):
+            day = start + datetime.timedelta(days=offset)
+            kept = previous.get("daily", {}).get(day.isoformat())
+            if kept and not rebuild_daily and os.path.exists(os.path.join(out_dir, *kept.split("/"))):
+                schedules[day] = kept
+            else:
+                schedules[day] = daily_rounds(pools, any_pool, daily_rounds_count, seed, day)
+
+        endless = {}
+        for name in POOLS:
+            if name == ANY_POOL:
+                pairs = random_rounds(any_pool, shard_size * shards, rng)
+            else:
+                # A difficulty pool is only worth as many shards as it has distinct pairs
+                count = min(shard_size * shards, -(-len(pools[name]) // shard_size) * shard_size)
+                pairs = shuffled_pairs(pools[name], count, rng)
+            endless[name] = [pairs[i:i + shard_size].tolist() for i in range(0, len(pairs), shard_size)]
+
+        ids = {character_id for schedule in schedules.values() if isinstance(schedule, tuple)
+               for pair in schedule[0] for character_id in pair}
+        ids.update(character_id for chunks in endless.values() for chunk in chunks
+                   for pair in chunk for character_id in pair)
+        characters = read_characters(conn, ids)
+    finally:
+        conn.close()
+
+    manifest = {"generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                "shard_size": shard_size, "daily": {}, "endless": {}}
+    for day, schedule in sorted(schedules.items()):
+        if isinstance(schedule, str):
+            manifest["daily"][day.isoformat()] = schedule
+            continue
+        pairs, difficulties = schedule
+        body = shard(pairs, characters, date=day.isoformat(), difficulty=difficulties)
+        manifest["daily"][day.isoformat()] = write_shard(out_dir, f"daily/{day.isoformat()}", body)
+    for name, chunks in endless.items():
+        manifest["endless"][name] = [write_shard(out_dir, f"endless/{name}/{index}", shard(chunk, characters))
+                                     for index, chunk in enumerate(chunks)]
+
+    write_atomically(os.path.join(out_dir, MANIFEST),
+                     json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+    # Clients holding the previous manifest can still fetch what it lists
+    removed = prune(out_dir, manifest_files(manifest) | manifest_files(previous))
+
+    files = manifest_files(manifest)
+    size = sum(os.path.getsize(os.path.join(out_dir, *path.split("/"))) for path in files)
+    print(f"Exported {len(manifest['daily'])} daily challenges ({daily_rounds_count} rounds) and "
+          + ", ".join(f"{name}={len(paths)}" for name, paths in manifest["endless"].items())
+          + f" endless shards of {shard_size} rounds to {out_dir}")
+    print(f"{len(files)} files, {size / 1024:.0f} KiB, {removed} old files removed, "
+          f"in {time.perf_counter() - started:.2f}s")
+    return manifest
+
+
+def main(db_path=DEFAULT_DB_PATH, out_dir=DEFAULT_OUT_DIR, daily_rounds_count=DEFAULT_DAILY_ROUNDS,
+         days=DEFAULT_DAYS, shard_size=DEFAULT_SHARD_SIZE, shards=DEFAULT_SHARDS, seed=0, start=None,
+         rebuild_daily=False):
+    return run(db_path, out_dir, daily_rounds_count, days, shard_size, shards, seed, start, rebuild_daily)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate round sequences as static JSON shards")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database to read (default: <repo>/database.sqlite)")
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR,
+                        help="Where to write the shards; server.js serves <repo>/rounds at /rounds (default: <repo>/rounds)")
+    parser.add_argument("--daily-rounds", type=int, default=DEFAULT_DAILY_ROUNDS,
+                        help=f"Rounds per daily challenge (default: {DEFAULT_DAILY_ROUNDS})")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                        help=f"Daily challenges to export, starting today (default: {DEFAULT_DAYS})")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, help="First day, as YYYY-MM-DD (default: today)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE,
+                        help=f"Rounds per endless shard (default: {DEFAULT_SHARD_SIZE})")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS,
+                        help=f"Endless shards per pool (default: {DEFAULT_SHARDS})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed the daily challenges are derived from (default: 0)")
+    parser.add_argument("--rebuild-daily", action="store_true",
+                        help="Regenerate daily challenges that were already exported")
+    args = parser.parse_args()
+
+    main(args.db, args.out_dir, args.daily_rounds, args.days, args.shard_size, args.shards, args.seed, args.start,
+         args.rebuild_daily)
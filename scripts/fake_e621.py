@@ -0,0 +1,245 @@
+"""Local stand-in for the e621 posts.json and tags.json endpoints.
+
+Serves a deterministic synthetic dataset (character_0 ... character_N-1 with
+falling post counts, a handful of posts each) with configurable latency,
+injected HTTP 429s, posts whose file.url is missing, as e621 does for
+login-only posts, and well-scored group posts tagged with two neighbouring
+characters. benchmark.py points the scripts at it through
+E621_BASE_URL; it can also be run on its own for manual testing:
+
+    python fake_e621.py --port 8621 --latency 0.05 --throttle-rate 0.02
+    E621_BASE_URL=http://localhost:8621 E621_REQUESTS_PER_SECOND=0 python get_chars.py out.csv
+
+It also stands in for static1.e621.net: /data/... answers HEAD and ranged
+GETs for any file path, with a size derived from the path and a share of
+404s, HTML pages and servers that refuse HEAD, so validate_images.py can be
+checked locally. --files-url makes posts.json hand out URLs on this server.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+
+from aiohttp import web
+
+DEFAULT_PORT = 8621
+DEFAULT_TAGS = 20000
+DEFAULT_POSTS_PER_TAG = 5
+DEFAULT_LATENCY = 0.05  # seconds
+DEFAULT_JITTER = 0.5  # +-50% of the latency
+DEFAULT_THROTTLE_RATE = 0.0
+DEFAULT_MISSING_RATE = 0.1
+DEFAULT_SHARED_RATE = 0.0
+DEFAULT_DEAD_FILE_RATE = 0.05
+DEFAULT_NOT_IMAGE_RATE = 0.02
+DEFAULT_NO_HEAD_RATE = 0.1
+DEFAULT_FILES_URL = "https://static1.e621.net"
+MAX_FILE_SIZE = 8 * 1024 * 1024
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "gif": "image/gif",
+                 "webp": "image/webp", "webm": "video/webm"}
+MAX_LIMIT = 320
+
+
+def character_name(index):
+    return f"character_{index}"
+
+
+def character_index(name):
+    prefix, _, index = name.rpartition("_")
+    return int(index) if prefix == "character" and index.isdigit() else None
+
+
+def _md5(*parts):
+    return hashlib.md5("/".join(map(str, parts)).encode()).hexdigest()
+
+
+class FakeE621:
+    """Synthetic dataset plus the aiohttp handlers that serve it"""
+
+    def __init__(self, tags=DEFAULT_TAGS, posts_per_tag=DEFAULT_POSTS_PER_TAG, latency=DEFAULT_LATENCY,
+                 jitter=DEFAULT_JITTER, throttle_rate=DEFAULT_THROTTLE_RATE, missing_rate=DEFAULT_MISSING_RATE,
+                 retry_after=None, seed=621, shared_rate=DEFAULT_SHARED_RATE, files_url=DEFAULT_FILES_URL,
+                 dead_file_rate=DEFAULT_DEAD_FILE_RATE, not_image_rate=DEFAULT_NOT_IMAGE_RATE,
+                 no_head_rate=DEFAULT_NO_HEAD_RATE):
+        self.tags = tags
+        self.posts_per_tag = posts_per_tag
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.missing_rate = missing_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.shared_rate = shared_rate
+        self.files_url = files_url.rstrip("/")
+        self.dead_file_rate = dead_file_rate
+        self.not_image_rate = not_image_rate
+        self.no_head_rate = no_head_rate
+        self.requests = 0
+        self.file_requests = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+
+    def post_count(self, index):
+        # Long-tailed like the real thing: a few huge tags, lots of small ones
+        return max(1, int(200000 / (1 + index) ** 0.9))
+
+    def tag(self, index):
+        return {"id": self.tags - index, "name": character_name(index), "post_count": self.post_count(index),
+                "category": 4, "updated_at": "2026-01-01T00:00:00.000-05:00"}
+
+    def posts_for(self, name):
+        """The posts tagged with one character, stable across requests
+
+        With shared_rate, a character's first post may also show the next
+        character; it then turns up in both characters' results.
+        """
+        posts = self._own_posts(name)
+        index = character_index(name)
+        if index:
+            previous = self._own_posts(character_name(index - 1))
+            posts += [post for post in previous if name in post["tags"]["character"]]
+        return posts
+
+    def _own_posts(self, name):
+        rng = random.Random(f"{self.seed}/{name}")
+        index = character_index(name)
+        # A separate stream, so the rest of the dataset doesn't depend on shared_rate
+        shared = (index is not None and self.shared_rate > 0
+                  and random.Random(f"{self.seed}/{name}/shared").random() < self.shared_rate)
+        posts = []
+        for i in range(self.posts_per_tag):
+            md5 = _md5(self.seed, name, i)
+            width, height = rng.choice([(1280, 960), (2400, 3000), (4000, 2800), (900, 1200)])
+            size = width * height // rng.choice([3, 5, 8])
+            group = shared and i == 0
+            missing = rng.random() < self.missing_rate and not group
+            ext = rng.choice(["png", "jpg", "jpg"])
+            posts.append({
+                "id": int(md5[:8], 16),
+                # Group shots of popular pairings tend to be among the best scored
+                "score": {"total": rng.randint(0, 5000) + (5000 if group else 0)},
+                "tags": {"character": [name, character_name(index + 1)] if group else [name]},
+                "file": {"url": None if missing else f"{self.files_url}/data/{md5[:2]}/{md5[2:4]}/{md5}.{ext}",
+                         "md5": md5, "ext": ext, "width": width, "height": height, "size": size},
+                "sample": {"has": not missing and width > 850,
+                           "url": None if missing else f"{self.files_url}/data/sample/{md5[:2]}/{md5[2:4]}/{md5}.jpg",
+                           "width": 850, "height": 850 * height // width},
+            })
+        return posts
+
+    async def _delay(self):
+        if self.latency:
+            spread = self.latency * self.jitter
+            await asyncio.sleep(max(0.0, self._random.uniform(self.latency - spread, self.latency + spread)))
+
+    def _throttle(self):
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            self.throttled += 1
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+            return web.json_response({"success": False, "reason": "Rate limited"}, status=429, headers=headers)
+        return None
+
+    async def posts_json(self, request):
+        self.requests += 1
+        await self._delay()
+        throttled = self._throttle()
+        if throttled is not None:
+            return throttled
+
+        limit = min(int(request.query.get("limit", 75)), MAX_LIMIT)
+        names = [term.lstrip("~") for term in request.query.get("tags", "").split()
+                 if not term.startswith(("order:", "-"))]
+        # A group post matches several of the OR'd tags but is returned once
+        posts = list({post["id"]: post for name in dict.fromkeys(names) for post in self.posts_for(name)}.values())
+        posts.sort(key=lambda post: post["score"]["total"], reverse=True)
+        return web.json_response({"posts": posts[:limit]})
+
+    async def tags_json(self, request):
+        self.requests += 1
+        await self._delay()
+        throttled = self._throttle()
+        if throttled is not None:
+            return throttled
+
+        limit = min(int(request.query.get("limit", 75)), MAX_LIMIT)
+        page = request.query.get("page", "1")
+        if page.startswith("b"):
+            # Cursor pagination: tags with an id below the cursor, newest first
+            start = self.tags - int(page[1:]) + 1
+        else:
+            start = (int(page) - 1) * limit
+        # Ids fall as post counts do, so count order and newest-first order agree
+        tags = [self.tag(index) for index in range(max(0, start), min(self.tags, start + limit))]
+        # e621 answers an empty search with {"tags": []} rather than []
+        return web.json_response(tags if tags else {"tags": []})
+
+    async def file(self, request):
+        """HEAD or GET one image file; what a path answers is stable across requests"""
+        self.file_requests += 1
+        await self._delay()
+        path = request.match_info["path"]
+        rng = random.Random(f"{self.seed}/file/{path}")
+        roll = rng.random()
+        if roll < self.dead_file_rate:
+            return web.Response(status=404)
+        if roll < self.dead_file_rate + self.not_image_rate:
+            # What a CDN error or login page looks like to a client
+            return web.Response(text="<html><body>Not an image</body></html>", content_type="text/html")
+        if request.method == "HEAD" and rng.random() < self.no_head_rate:
+            return web.Response(status=405)
+
+        size = rng.randint(20000, 400000 if path.startswith("sample/") else MAX_FILE_SIZE)
+        content_type = CONTENT_TYPES.get(path.rsplit(".", 1)[-1].lower(), "application/octet-stream")
+        if request.headers.get("Range") == "bytes=0-0":
+            return web.Response(status=206, body=b"\0", content_type=content_type,
+                                headers={"Content-Range": f"bytes 0-0/{size}"})
+        if request.method == "HEAD":
+            return web.Response(content_type=content_type, headers={"Content-Length": str(size)})
+        return web.Response(body=bytes(size), content_type=content_type)
+
+    async def stats(self, request):
+        return web.json_response({"requests": self.requests, "throttled": self.throttled,
+                                  "file_requests": self.file_requests})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/posts.json", self.posts_json)
+        app.router.add_get("/tags.json", self.tags_json)
+        app.router.add_get("/data/{path:.*}", self.file)
+        app.router.add_get("/_stats", self.stats)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic e621 API for benchmarks and tests")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--tags", type=int, default=DEFAULT_TAGS, help=f"Character tags in the dataset (default: {DEFAULT_TAGS})")
+    parser.add_argument("--posts-per-tag", type=int, default=DEFAULT_POSTS_PER_TAG,
+                        help=f"Posts per character (default: {DEFAULT_POSTS_PER_TAG})")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help=f"Mean response latency in seconds (default: {DEFAULT_LATENCY})")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help=f"Latency spread as a fraction of the mean (default: {DEFAULT_JITTER})")
+    parser.add_argument("--throttle-rate", type=float, default=DEFAULT_THROTTLE_RATE,
+                        help="Fraction of requests answered with HTTP 429 (default: 0)")
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with injected 429s (default: none)")
+    parser.add_argument("--missing-rate", type=float, default=DEFAULT_MISSING_RATE,
+                        help=f"Fraction of posts without a file.url (default: {DEFAULT_MISSING_RATE})")
+    parser.add_argument("--shared-rate", type=float, default=DEFAULT_SHARED_RATE,
+                        help="Fraction of characters whose top post also shows the next character (default: 0)")
+    parser.add_argument("--files-url", default=DEFAULT_FILES_URL,
+                        help="Host put in post file URLs, e.g. this server's own URL (default: static1.e621.net)")
+    parser.add_argument("--dead-file-rate", type=float, default=DEFAULT_DEAD_FILE_RATE,
+                        help=f"Fraction of /data files answering 404 (default: {DEFAULT_DEAD_FILE_RATE})")
+    parser.add_argument("--not-image-rate", type=float, default=DEFAULT_NOT_IMAGE_RATE,
+                        help=f"Fraction of /data files answering with an HTML page (default: {DEFAULT_NOT_IMAGE_RATE})")
+    parser.add_argument("--no-head-rate", type=float, default=DEFAULT_NO_HEAD_RATE,
+                        help=f"Fraction of /data files refusing HEAD with 405 (default: {DEFAULT_NO_HEAD_RATE})")
+    parser.add_argument("--seed", type=int, default=621, help="Dataset and randomness seed (default: 621)")
+    args = parser.parse_args()
+
+    fake = FakeE621(args.tags, args.posts_per_tag, args.latency, args.jitter, args.throttle_rate,
+                    args.missing_rate, args.retry_after, args.seed, args.shared_rate, args.files_url,
+                    args.dead_file_rate, args.not_image_rate, args.no_head_rate)
+    web.run_app(fake.app(), port=args.port, print=None)
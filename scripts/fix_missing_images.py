@@ -1,228 +1,194 @@
+import asyncio
+import contextlib
 import csv
-import requests
 import sys
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from time import sleep
-
-SPACE = " "
-
-def find_top_image_url(tag_name, max_retries=3, debug=True, login=None, api_key=None):
-    """Query e621 API for the top image URL for a given tag name with retry logic"""
-    BASE_URL = "https://e621.net/posts.json"
-    HEADERS = {
-        "User-Agent": "YourProject/1.0 (by yourusername on e621)"
-    }
-    tags = [tag_name, "order:score", "-animated"]
-    tags_string = SPACE.join(tags)
-    params = {
-        "tags": tags_string,
-        "limit": 10,  # Get more posts to check for valid URLs
-        "page": 1,
-    }
-    
-    # Add login credentials if provided
-    if login and api_key:
-        params["login"] = login
-        params["api_key"] = api_key
-        if debug:
-            print(f"Using login credentials: {login}")
-    elif debug:
-        print("No login credentials provided - some posts may be unavailable")
-    
-    if debug:
-        print(f"\n--- DEBUG: Querying {tag_name} ---")
-        print(f"Request URL: {BASE_URL}")
-        print(f"Query tags: {tags_string}")
-        print(f"Full params: {params}")
-    
-    for attempt in range(max_retries):
-        try:
-            if debug:
-                print(f"Making request (attempt {attempt + 1})...")
-            
-            response = requests.get(BASE_URL, headers=HEADERS, params=params)
-            
-            if debug:
-                print(f"Response status: {response.status_code}")
-                print(f"Response headers: {dict(response.headers)}")
-            
-            if response.status_code != 200:
-                print(f"Error fetching post for {tag_name} (attempt {attempt + 1}): HTTP {response.status_code}")
-                if debug:
-                    print(f"Response content: {response.text[:500]}...")
-                if attempt < max_retries - 1:
-                    print(f"Retrying in 3 seconds...")
-                    sleep(3)
-                    continue
-                return ""
-            
-            response_data = response.json()
-            results = response_data.get("posts", [])
-            
-            if debug:
-                print(f"API response structure: {type(response_data)}")
-                print(f"Posts array length: {len(results)}")
-                if results:
-                    post = results[0]
-                    print(f"First post keys: {list(post.keys())}")
-                    if "file" in post:
-                        print(f"Post: {post}")
-                        print(f"File object: {post['file']}")
-                        print(f"File URL: {post['file'].get('url', 'NO URL KEY')}")
-                    else:
-                        print("NO 'file' key in post object")
-                else:
-                    print("No posts in response")
-                    print(f"Full response: {response_data}")
-            
-            if results:
-                # Iterate through posts to find one with a valid image URL
-                for i, post in enumerate(results):
-                    if debug:
-                        print(f"Checking post {i+1}/{len(results)}: {post.get('id', 'no_id')}")
-                    
-                    if "file" in post and post["file"] and post["file"].get("url"):
-                        url = post["file"]["url"]
-                        if debug:
-                            print(f"SUCCESS: Found URL in post {i+1}: {url}")
-                        return url
-                    else:
-                        if debug:
-                            if "file" not in post:
-                                print(f"  -> Post {i+1} has no 'file' key")
-                            elif not post["file"]:
-                                print(f"  -> Post {i+1} file object is None/empty")
-                            elif not post["file"].get("url"):
-                                print(f"  -> Post {i+1} file has no URL (likely login required)")
-                
-                # If we get here, no posts had valid URLs
-                print(f"No valid URLs found in {len(results)} posts for {tag_name} (attempt {attempt + 1})")
-                if debug:
-                    print("  -> All posts either missing file object or require login")
-                
-                if attempt < max_retries - 1:
-                    print(f"Retrying in 3 seconds...")
-                    sleep(3)
-                    continue
-                return ""
-            else:
-                print(f"No posts returned for {tag_name} (attempt {attempt + 1})")
-                if attempt < max_retries - 1:
-                    print(f"Retrying in 3 seconds...")
-                    sleep(3)
-                    continue
-                return ""
-                
-        except Exception as e:
-            print(f"Exception fetching post for {tag_name} (attempt {attempt + 1}): {e}")
-            if debug:
-                import traceback
-                print(f"Full traceback: {traceback.format_exc()}")
-            if attempt < max_retries - 1:
-                print(f"Retrying in 3 seconds...")
-                sleep(3)
-                continue
-            return ""
-    
-    return ""
+from collections import Counter
+
+from e621_client import E621Client, find_image_candidates, tag_query
+from image_selection import DEFAULT_CANDIDATES, CandidateIndex, candidates_path_for, md5_from_url
+from response_cache import ResponseCache
+from row_writer import RowWriter
+from streaming import TaskPool, count_rows, in_flight_limit, read_fieldnames, read_rows
+from validate_images import DEFAULT_REQUESTS_PER_SECOND, Validator, fixed_row
+
+IMAGE_FIELDS = ["image_url", "image_width", "image_height"]
+
+def is_missing(row):
+    return not row.get("image_url") or row["image_url"].strip() == ""
+
+def row_values(row, fieldnames):
+    return [row.get(field) if row.get(field) is not None else "" for field in fieldnames]
+
+def image_key(url):
+    """The first 64 bits of the md5 in an image URL as an int (None without one), to keep the index small"""
+    md5, _ = md5_from_url(url)
+    return int(md5[:16], 16) if md5 is not None else None
+
+def used_images(input_csv):
+    """Keys (see image_key) of every image the input already shows"""
+    used = set()
+    for row in read_rows(input_csv):
+        key = image_key(row.get("image_url"))
+        if key is not None:
+            used.add(key)
+    return used
+
+def pick_unused(candidates, used):
+    """The best candidate whose image no other character shows yet (else the best one), marked as used"""
+    if not candidates:
+        return None, False
+    image = next((c for c in candidates if image_key(c.url) not in used), None)
+    shared = image is None
+    image = image or candidates[0]
+    used.add(image_key(image.url))
+    return image, shared
+
+async def process_missing_character(client, index, row, fieldnames, writer, stats, used, validator=None, debug_mode=False):
+    """Process a single character with missing image and hand the result to the writer
 
-def process_missing_character(row, write_lock, writer, processed_count, debug_mode=False, login=None, api_key=None):
-    """Process a single character with missing image and write result to CSV"""
+    With a validator the stored URL is checked first, and a bad one is
+    replaced by a promoted candidate or treated as missing. A re-fetch skips
+    images in `used` (see used_images), so it doesn't pick another
+    character's image.
+    """
     tag_name = row["name"]
-    existing_url = row["image_url"]
+    if validator is not None:
+        result = await validator.check(row)
+        stats["verdicts"][result["verdict"]] += 1
+        if result["promoted"]:
+            stats["verdicts"]["promoted"] += 1
+            used.add(image_key(result["promoted"]["url"]))
+        row = fixed_row(row, result, fieldnames)
     
     # Only query if image_url is missing (empty or None)
-    if not existing_url or existing_url.strip() == "":
-        # replace spaces with underscores for tag naming
-        tag_query = tag_name.replace(" ", "_")
-        image_url = find_top_image_url(tag_query, debug=debug_mode, login=login, api_key=api_key)
-        print(f"Fetched for {tag_name}: {image_url}")
-    else:
-        image_url = existing_url
-        print(f"Keeping existing for {tag_name}: {image_url}")
-    
-    # Thread-safe writing
-    with write_lock:
-        writer.writerow([tag_name, image_url])
-        processed_count[0] += 1
-        if processed_count[0] % 50 == 0:
-            print(f"Progress: {processed_count[0]} characters processed")
-    
-    return tag_name, image_url
+    if is_missing(row):
+        try:
+            candidates = await find_image_candidates(client, tag_query(tag_name), DEFAULT_CANDIDATES,
+                                                     max_retries=3, debug=debug_mode)
+        except Exception as e:
+            print(f"Error processing {tag_name}: {e}")
+            candidates = []
+        image, shared = pick_unused(candidates, used)
+        if shared:
+            stats["shared"] += 1
+        if image is not None:
+            stats["fixed"] += 1
+            row.update(image_url=image.url, image_width=image.width, image_height=image.height)
+            if "local_image" in row:
+                row["local_image"] = ""  # the old derivative belongs to a different image
+        else:
+            stats["still_missing"] += 1
+        if debug_mode:
+            print(f"Fetched for {tag_name}: {row['image_url']}")
+    
+    await writer.put(index, row_values(row, fieldnames))
+    return row["image_url"]
 
-def main(input_csv="top_img.csv", output_csv="top_img_2.csv", max_workers=10, debug_mode=False, login=None, api_key=None):
-    """Main function to process missing images"""
-    # Read all rows first
-    rows = []
-    with open(input_csv, newline="", encoding="utf-8") as infile:
-        reader = csv.DictReader(infile)
-        rows = list(reader)
-    
-    # Count missing images
-    missing_count = sum(1 for row in rows if not row["image_url"] or row["image_url"].strip() == "")
-    total_count = len(rows)
+async def run(input_csv="top_img.csv", output_csv="top_img_2.csv", max_workers=10, debug_mode=False, login=None, api_key=None, no_cache=False, validate=False,
+              validate_rps=DEFAULT_REQUESTS_PER_SECOND):
+    """Fill in missing image URLs concurrently through one shared client
+
+    Rows are streamed: the input is read lazily, at most a few tasks per
+    worker are in flight, and rows that need no lookup go straight to the
+    writer, so memory stays flat however many characters there are.
+
+    With validate=True every stored URL is checked first. Dead or oversized
+    ones are replaced by the next working entry of <input>_candidates.csv
+    when there is one, and otherwise treated as missing so they get re-fetched.
+    The candidates are looked up in an on-disk index rather than loaded, and
+    the checks run max_workers at a time within validate_rps requests per
+    second (0 for no limit) against the image host.
+    """
+    # Keep whatever columns the input has (e.g. local_image) and add dimensions
+    fieldnames = read_fieldnames(input_csv)
+    fieldnames = fieldnames + [f for f in IMAGE_FIELDS if f not in fieldnames]
+    
+    # Count missing images (a cheap pass that keeps no rows)
+    total_count = count_rows(input_csv)
+    missing_count = count_rows(input_csv, is_missing)
     
     print(f"Found {total_count} total characters")
     print(f"Found {missing_count} characters with missing images")
-    print(f"Processing with {max_workers} threads...")
     
-    if missing_count == 0:
+    if missing_count == 0 and not validate:
         print("No missing images found! Creating copy of original file...")
         with open(output_csv, "w", newline="", encoding="utf-8") as outfile:
-            writer = csv.writer(outfile)
-            writer.writerow(["name", "image_url"])
-            for row in rows:
-                writer.writerow([row["name"], row["image_url"]])
+            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(read_rows(input_csv))
         return
     
-    # Create thread-safe writing setup
-    write_lock = threading.Lock()
-    processed_count = [0]  # Use list so it can be modified in threads
-    
-    with open(output_csv, "w", newline="", encoding="utf-8") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(["name", "image_url"])
+    print(f"Processing with {max_workers} concurrent requests...")
+    stats = {"fixed": 0, "still_missing": 0, "shared": 0, "verdicts": Counter()}
+    used = used_images(input_csv)
+    with open(output_csv, "w", newline="", encoding="utf-8") as outfile, \
+            (CandidateIndex(candidates_path_for(input_csv)) if validate else contextlib.nullcontext()) as candidates:
+        csv.writer(outfile).writerow(fieldnames)
         
-        # Use ThreadPoolExecutor for parallel processing
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks
-            future_to_row = {
-                executor.submit(process_missing_character, row, write_lock, writer, processed_count, debug_mode, login, api_key): row 
-                for row in rows
-            }
-            
-            # Process completed tasks
-            completed = 0
-            errors = 0
-            for future in as_completed(future_to_row):
-                try:
-                    tag_name, image_url = future.result()
-                    completed += 1
-                except Exception as e:
-                    row = future_to_row[future]
-                    print(f"Error processing {row['name']}: {e}")
-                    # Write the row with empty image_url if there was an error
-                    with write_lock:
-                        writer.writerow([row['name'], row.get('image_url', '')])
-                        processed_count[0] += 1
-                    errors += 1
-                    completed += 1
+        async with E621Client(login=login, api_key=api_key, concurrency=max_workers,
+                               cache=ResponseCache(), bypass_cache=no_cache) as client:
+            if login:
+                print(f"Using login credentials: {login}")
+            elif debug_mode:
+                print("No login credentials provided - some posts may be unavailable")
+
+            # A single writer stage owns the file and keeps the input order
+            async with (Validator(max_workers, validate_rps, candidates=candidates) if validate else contextlib.nullcontext()) as validator, \
+                    RowWriter(outfile, total=total_count, ordered=True, label="characters") as writer, \
+                    TaskPool(in_flight_limit(max_workers)) as pool:
+                for index, row in enumerate(read_rows(input_csv)):
+                    if validator is None and not is_missing(row):
+                        await writer.put(index, row_values(row, fieldnames))
+                        continue
+                    await pool.submit(process_missing_character(client, index, row, fieldnames, writer, stats, used,
+                                                                validator, debug_mode))
+
+            if validate:
+                print("Verdicts: " + ", ".join(f"{verdict}={count}" for verdict, count in sorted(stats["verdicts"].items())))
+            if client.retries:
+                print(f"Retried {client.retries} requests after rate limiting or server errors")
+            print(f"Cache: {client.cache.hits} hits, {client.cache.revalidated} revalidated, {client.cache.misses} misses")
+            client.metrics.report("Lookup")
     
     print(f"\nCompleted processing {total_count} characters!")
-    print(f"Successfully processed: {completed - errors}")
-    print(f"Errors: {errors}")
+    print(f"Fixed: {stats['fixed']}")
+    print(f"Still missing: {stats['still_missing']}")
+    if stats["shared"]:
+        print(f"Shared: {stats['shared']} got an image another character already shows (no unused one found)")
     print(f"Output written to: {output_csv}")
 
+def main(input_csv="top_img.csv", output_csv="top_img_2.csv", max_workers=10, debug_mode=False, login=None, api_key=None, no_cache=False, validate=False,
+         validate_rps=DEFAULT_REQUESTS_PER_SECOND):
+    """Main function to process missing images"""
+    asyncio.run(run(input_csv, output_csv, max_workers, debug_mode, login, api_key, no_cache, validate, validate_rps))
+
 if __name__ == "__main__":
-    if len(sys.argv) < 1 or len(sys.argv) > 7:
-        print("Usage: python fix_missing_images.py [input.csv] [output.csv] [max_workers] [debug] [login] [api_key]")
+    # --no-cache skips cached responses (fresh answers are still written back)
+    # --validate checks stored URLs first and re-fetches dead or oversized ones
+    no_cache = "--no-cache" in sys.argv
+    validate = "--validate" in sys.argv
+    argv = [arg for arg in sys.argv if arg not in ("--no-cache", "--validate")]
+    # --validate-rps N: requests per second for the URL checks (0 for no limit)
+    validate_rps = DEFAULT_REQUESTS_PER_SECOND
+    if "--validate-rps" in argv:
+        position = argv.index("--validate-rps")
+        validate_rps = float(argv[position + 1]) if position + 1 < len(argv) else None
+        del argv[position:position + 2]
+        if validate_rps is None:
+            print("Error: --validate-rps needs a number")
+            sys.exit(1)
+    
+    if len(argv) < 1 or len(argv) > 7:
+        print("Usage: python fix_missing_images.py [input.csv] [output.csv] [max_workers] [debug] [login] [api_key] [--no-cache] [--validate] [--validate-rps N]")
         print("  input.csv: Input CSV file (default: top_img.csv)")
         print("  output.csv: Output CSV file (default: top_img_2.csv)")
-        print("  max_workers: Number of threads (default: 10)")
+        print("  max_workers: Number of concurrent requests (default: 10)")
         print("  debug: Enable debug mode (true/false, default: false)")
         print("  login: e621 username (optional, for accessing login-required posts)")
         print("  api_key: e621 API key (optional, required if login provided)")
+        print("  --no-cache: Ignore cached API responses and re-query e621")
+        print("  --validate: Check stored URLs first and re-fetch dead or oversized ones")
+        print(f"  --validate-rps N: Requests per second for those checks, 0 for no limit (default: {DEFAULT_REQUESTS_PER_SECOND:g})")
         print("\nExample:")
         print("  python fix_missing_images.py top_img.csv top_img_fixed.csv 5 false myusername myapikey")
         sys.exit(1)
@@ -234,22 +200,22 @@ if __name__ == "__main__":
     login = None
     api_key = None
     
-    if len(sys.argv) >= 2:
-        input_csv = sys.argv[1]
-    if len(sys.argv) >= 3:
-        output_csv = sys.argv[2]
-    if len(sys.argv) >= 4:
-        max_workers = int(sys.argv[3])
-    if len(sys.argv) >= 5:
-        debug_mode = sys.argv[4].lower() in ['true', '1', 'yes', 'on']
-    if len(sys.argv) >= 6:
-        login = sys.argv[5]
-    if len(sys.argv) >= 7:
-        api_key = sys.argv[6]
+    if len(argv) >= 2:
+        input_csv = argv[1]
+    if len(argv) >= 3:
+        output_csv = argv[2]
+    if len(argv) >= 4:
+        max_workers = int(argv[3])
+    if len(argv) >= 5:
+        debug_mode = argv[4].lower() in ['true', '1', 'yes', 'on']
+    if len(argv) >= 6:
+        login = argv[5]
+    if len(argv) >= 7:
+        api_key = argv[6]
     
     # Validate that both login and api_key are provided together
     if (login and not api_key) or (api_key and not login):
         print("Error: Both login and api_key must be provided together")
         sys.exit(1)
     
-    main(input_csv, output_csv, max_workers, debug_mode, login, api_key)
+    main(input_csv, output_csv, max_workers, debug_mode, login, api_key, no_cache, validate, validate_rps)
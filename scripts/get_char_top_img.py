@@ -1,127 +1,241 @@
+import argparse
+import asyncio
 import csv
-import requests
 import sys
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from time import sleep
-
-SPACE = " "
-
-def find_top_image_url(tag_name, login=None, api_key=None):
-    BASE_URL = "https://e621.net/posts.json"
-    HEADERS = {
-        "User-Agent": "YourProject/1.0 (by yourusername on e621)"
-    }
-    tags = [tag_name, "order:score", "-animated"]
-    tags_string = SPACE.join(tags)
-    params = {
-        "tags": tags_string,
-        "limit": 10,  # Get more posts to check for valid URLs
-        "page": 1,
-    }
-    
-    # Add login credentials if provided
-    if login and api_key:
-        params["login"] = login
-        params["api_key"] = api_key
+import time
+
+from checkpoint import (DEFAULT_COUNT_CHANGE, DEFAULT_MAX_AGE_DAYS, CheckpointJournal, journal_path_for,
+                        needs_refresh, parse_int, seed_from_csv, write_csv_atomically)
+from e621_client import DEFAULT_BATCH_SIZE, E621Client, find_candidates, tag_query
+from image_selection import (DEFAULT_CANDIDATES, candidate_record, candidates_path_for, exclusive_candidates,
+                             read_candidates, resolve_duplicates, write_candidates)
+from response_cache import ResponseCache
+from row_writer import RowWriter
+from streaming import TaskPool, batched, count_rows, in_flight_limit, read_rows
+
+
+OUTPUT_FIELDS = ["name", "image_url", "image_width", "image_height"]
+
+
+def output_row(record):
+    return [record.get(field) if record.get(field) is not None else "" for field in OUTPUT_FIELDS]
+
+
+def write_candidates_file(output_csv, records, previous=None, taken=None):
+    """Write the ranked fallback images of every record next to output_csv
+
+    `records` is an iterable of journal records. Records from before
+    candidates were journaled keep whatever `previous` (the last candidates
+    file) had for them. Candidates showing an image `taken` ({md5: name},
+    see resolve_duplicates) by another character are left out.
+    """
+    previous = previous or {}
+    taken = taken or {}
+    path = candidates_path_for(output_csv)
+
+    def pairs():
+        for record in records:
+            name = record["name"]
+            candidates = record["candidates"] if "candidates" in record else previous.get(name, [])
+            yield name, exclusive_candidates(name, candidates, taken)
+
+    write_candidates(path, pairs())
+    return path
+
+
+def with_candidate(record, candidate):
+    return {**record, "image_url": candidate["url"], "image_width": candidate.get("width"),
+            "image_height": candidate.get("height")}
+
+
+def report_duplicates(replacements, shared):
+    if replacements or shared:
+        print(f"Shared images: moved {len(replacements)} characters to their next-best image, "
+              f"{len(shared)} have no unused candidate left")
+
+
+def dedupe_output(output_csv, journal, replacements):
+    """Swap the `replacements` from resolve_duplicates into output_csv and the journal
+
+    Runs after a full run, whose journal holds exactly one record per row.
+    """
+    if not replacements:
+        return 0
+
+    updated = {record["name"]: with_candidate(record, replacements[record["name"]])
+               for record in journal.iter_records() if record["name"] in replacements}
+    journal.open()
+    try:
+        for record in updated.values():
+            journal.append(**record)
+    finally:
+        journal.close()
+
+    def rows():
+        with open(output_csv, newline="", encoding="utf-8") as infile:
+            for row in csv.DictReader(infile):
+                yield output_row(updated.get(row["name"], row))
+
+    write_csv_atomically(output_csv, OUTPUT_FIELDS, rows())
+    return len(updated)
+
+
+async def process_batch(client, batch, writer, candidates=DEFAULT_CANDIDATES):
+    """Look up a batch of (index, row) pairs with one OR-query and hand the results to the writer"""
+    queries = [tag_query(row["name"]) for _, row in batch]
     try:
-        response = requests.get(BASE_URL, headers=HEADERS, params=params)
-        if response.status_code != 200:
-            print(f"Error fetching post for {tag_name}: HTTP {response.status_code}")
-            return ""
-        results = response.json().get("posts", [])
-        if results:
-            # Iterate through posts to find one with a valid image URL
-            for i, post in enumerate(results):
-                if "file" in post and post["file"] and post["file"].get("url"):
-                    return post["file"]["url"]
-            # If no valid URLs found
-            print(f"No valid URLs found in {len(results)} posts for {tag_name} (likely all require login)")
-            return ""
-        else:
-            return ""
+        found = await find_candidates(client, queries, candidates)
     except Exception as e:
-        print(f"Exception fetching post for {tag_name}: {e}")
-        return ""
-
-def process_character(row, write_lock, writer, login=None, api_key=None):
-    """Process a single character and write result to CSV"""
-    tag_name = row["name"]
-    # replace spaces with underscores for tag naming
-    tag_query = tag_name.replace(" ", "_")
-    image_url = find_top_image_url(tag_query, login=login, api_key=api_key)
-    
-    # Thread-safe writing
-    with write_lock:
-        writer.writerow([tag_name, image_url])
-        print(f"{tag_name}: {image_url}")
-    
-    return tag_name, image_url
-
-def main(input_csv, output_csv, max_workers=10, login=None, api_key=None):
-    """Main function with parallel processing"""
-    # Read all rows first
-    rows = []
-    with open(input_csv, newline="", encoding="utf-8") as infile:
-        reader = csv.DictReader(infile)
-        rows = list(reader)
-    
-    print(f"Processing {len(rows)} characters with {max_workers} threads...")
-    
-    # Create thread-safe writing setup
-    write_lock = threading.Lock()
-    
-    with open(output_csv, "w", newline="", encoding="utf-8") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(["name", "image_url"])
-        
-        # Use ThreadPoolExecutor for parallel processing
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks
-            future_to_row = {
-                executor.submit(process_character, row, write_lock, writer, login, api_key): row 
-                for row in rows
-            }
-            
-            # Process completed tasks
-            completed = 0
-            for future in as_completed(future_to_row):
-                try:
-                    tag_name, image_url = future.result()
-                    completed += 1
-                    if completed % 50 == 0:  # Progress update every 50 characters
-                        print(f"Progress: {completed}/{len(rows)} characters processed")
-                except Exception as e:
-                    row = future_to_row[future]
-                    print(f"Error processing {row['name']}: {e}")
-                    completed += 1
-    
-    print(f"Completed processing {len(rows)} characters!")
+        print(f"Error processing batch starting at {batch[0][1]['name']}: {e}")
+        found = {}
+
+    for (index, row), query in zip(batch, queries):
+        ranked = found.get(query) or []
+        image = ranked[0] if ranked else None
+        record = {
+            "name": row["name"],
+            "image_url": image.url if image else "",
+            "post_count": parse_int(row.get("post_count")),
+            "image_width": image.width if image else None,
+            "image_height": image.height if image else None,
+            "candidates": [candidate_record(candidate) for candidate in ranked],
+        }
+        await writer.put(index, output_row(record), record)
+
+
+async def fetch_all(client, rows, outfile, journal, batch_size=DEFAULT_BATCH_SIZE, ordered=False,
+                    candidates=DEFAULT_CANDIDATES, total=None):
+    """Run every lookup and stream the results through a single writer stage
+
+    `rows` is consumed lazily and only a couple of batches per worker are in
+    flight at once, so memory doesn't grow with the number of rows.
+    """
+    # Rows arrive sorted by post_count, so each batch holds characters of
+    # similar popularity and none of them crowds the others out of the results
+    batch_size = max(1, batch_size)
+    async with RowWriter(outfile, journal=journal, total=total, ordered=ordered, label="characters") as writer, \
+            TaskPool(in_flight_limit(client.concurrency)) as pool:
+        for batch in batched(enumerate(rows), batch_size):
+            await pool.submit(process_batch(client, batch, writer, candidates))
+
+    if client.retries:
+        print(f"Retried {client.retries} requests after rate limiting or server errors")
+    print(f"Cache: {client.cache.hits} hits, {client.cache.revalidated} revalidated, {client.cache.misses} misses")
+    client.metrics.report("Lookup")
+
+
+async def run(input_csv, output_csv, max_workers=10, login=None, api_key=None, no_cache=False,
+              incremental=False, max_age_days=DEFAULT_MAX_AGE_DAYS, count_change=DEFAULT_COUNT_CHANGE,
+              batch_size=DEFAULT_BATCH_SIZE, ordered=False, candidates=DEFAULT_CANDIDATES):
+    """Look up characters concurrently through one shared client
+
+    A full run rewrites output_csv from scratch. An incremental run only looks
+    up rows that are missing, older than max_age_days or whose post_count moved
+    by more than count_change since they were fetched, and resumes wherever an
+    interrupted run left off. batch_size characters share one posts.json
+    request; 1 goes back to one request per character. With ordered=True a
+    full run writes rows in input order instead of completion order.
+
+    Up to `candidates` ranked images per character (the chosen one first)
+    are also written to <output>_candidates.csv for validate_images.py and
+    load_db.py to fall back on.
+    """
+    # Rows are streamed from input_csv; only a cheap count happens up front
+    total = count_rows(input_csv)
+    journal = CheckpointJournal(journal_path_for(output_csv))
+    client = E621Client(login=login, api_key=api_key, concurrency=max_workers,
+                        cache=ResponseCache(), bypass_cache=no_cache)
+
+    if not incremental:
+        print(f"Processing {total} characters with {max_workers} concurrent requests...")
+        with open(output_csv, "w", newline="", encoding="utf-8") as outfile:
+            csv.writer(outfile).writerow(OUTPUT_FIELDS)
+            journal.open(truncate=True)
+            try:
+                async with client:
+                    await fetch_all(client, read_rows(input_csv), outfile, journal, batch_size, ordered,
+                                    candidates, total)
+            finally:
+                journal.close()
+        # The journal was truncated for this run, so it holds exactly one record per row
+        replacements, shared, taken = resolve_duplicates(journal.iter_records)
+        report_duplicates(replacements, shared)
+        path = write_candidates_file(output_csv, journal.iter_records(), taken=taken)
+        dedupe_output(output_csv, journal, replacements)
+        print(f"Candidate images written to: {path}")
+        print(f"Completed processing {total} characters!")
+        return
+
+    # The journal's records (one per tag) are the only per-row state kept in memory
+    records = journal.load() or seed_from_csv(output_csv)
+    now = time.time()
+
+    def stale(row):
+        return needs_refresh(row, records.get(row["name"]), max_age_days, count_change, now)
+
+    todo = count_rows(input_csv, stale)
+    print(f"Incremental refresh: {todo} of {total} characters need a lookup "
+          f"({total - todo} up to date)")
+
+    journal.open()
+    try:
+        if todo:
+            async with client:
+                await fetch_all(client, (row for row in read_rows(input_csv) if stale(row)), None, journal,
+                                batch_size, candidates=candidates, total=todo)
+    finally:
+        journal.close()
+
+    # Merge fresh results over the previous ones and swap the output in atomically
+    records.update(journal.load())
+    names = [row["name"] for row in read_rows(input_csv)]
+    replacements, shared, taken = resolve_duplicates(lambda: (records[name] for name in names if name in records))
+    report_duplicates(replacements, shared)
+    for name, candidate in replacements.items():
+        records[name] = with_candidate(records[name], candidate)
+    write_csv_atomically(output_csv, OUTPUT_FIELDS, (output_row(records.get(name, {"name": name})) for name in names))
+    path = write_candidates_file(output_csv, (records.get(name, {"name": name}) for name in names),
+                                 read_candidates(candidates_path_for(output_csv)), taken)
+    journal.compact({name: records[name] for name in names if name in records})
+    print(f"Candidate images written to: {path}")
+    print(f"Completed incremental refresh of {total} characters!")
+
+
+def main(input_csv, output_csv, max_workers=10, login=None, api_key=None, no_cache=False,
+         incremental=False, max_age_days=DEFAULT_MAX_AGE_DAYS, count_change=DEFAULT_COUNT_CHANGE,
+         batch_size=DEFAULT_BATCH_SIZE, ordered=False, candidates=DEFAULT_CANDIDATES):
+    """Main function with concurrent processing"""
+    asyncio.run(run(input_csv, output_csv, max_workers, login, api_key, no_cache,
+                    incremental, max_age_days, count_change, batch_size, ordered, candidates))
+
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3 or len(sys.argv) > 6:
-        print("Usage: python get_char_top_img.py input.csv output.csv [max_workers] [login] [api_key]")
-        print("  max_workers: Number of threads (default: 10)")
-        print("  login: e621 username (optional, for accessing login-required posts)")
-        print("  api_key: e621 API key (optional, required if login provided)")
-        print("\nExample:")
-        print("  python get_char_top_img.py chars.csv images.csv 5 myusername myapikey")
-        sys.exit(1)
-    
-    max_workers = 10
-    login = None
-    api_key = None
-    
-    if len(sys.argv) >= 4:
-        max_workers = int(sys.argv[3])
-    if len(sys.argv) >= 5:
-        login = sys.argv[4]
-    if len(sys.argv) >= 6:
-        api_key = sys.argv[5]
-    
+    parser = argparse.ArgumentParser(description="Find a representative e621 image URL for each character")
+    parser.add_argument("input_csv", help="CSV with name and post_count columns")
+    parser.add_argument("output_csv", help="CSV to write name,image_url,image_width,image_height rows to")
+    parser.add_argument("max_workers", nargs="?", type=int, default=10,
+                        help="Number of concurrent requests (default: 10)")
+    parser.add_argument("login", nargs="?", help="e621 username (optional, for accessing login-required posts)")
+    parser.add_argument("api_key", nargs="?", help="e621 API key (optional, required if login provided)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached API responses and re-query e621")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only look up missing, stale or changed rows; resumes interrupted runs")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help=f"Days before a stored URL is considered stale (default: {DEFAULT_MAX_AGE_DAYS})")
+    parser.add_argument("--count-change", type=float, default=DEFAULT_COUNT_CHANGE,
+                        help=f"Relative post_count change that triggers a refresh (default: {DEFAULT_COUNT_CHANGE})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Characters per OR-tag posts.json query, 1 to disable batching (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--ordered", action="store_true",
+                        help="Write rows in input order rather than completion order")
+    parser.add_argument("--candidates", type=int, default=DEFAULT_CANDIDATES,
+                        help=f"Ranked images to keep per character for fallbacks (default: {DEFAULT_CANDIDATES})")
+    args = parser.parse_args()
+
     # Validate that both login and api_key are provided together
-    if (login and not api_key) or (api_key and not login):
+    if (args.login and not args.api_key) or (args.api_key and not args.login):
         print("Error: Both login and api_key must be provided together")
         sys.exit(1)
-    
-    main(sys.argv[1], sys.argv[2], max_workers, login, api_key)
+
+    main(args.input_csv, args.output_csv, args.max_workers, args.login, args.api_key, args.no_cache,
+         args.incremental, args.max_age, args.count_change, args.batch_size, args.ordered, args.candidates)
@@ -1,50 +1,137 @@
-import requests
-import csv
 import argparse
-from time import sleep
+import asyncio
+import csv
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(description='Fetch top character tags from e621.net and save to CSV')
-parser.add_argument('output_file', help='Path to the output CSV file')
-args = parser.parse_args()
+from e621_client import E621Client
+from response_cache import ResponseCache
+from row_writer import RowWriter
 
-BASE_URL = "https://e621.net/tags.json"
-HEADERS = {
-    "User-Agent": "YourProject/1.0 (by yourusername on e621)"  # Must set a custom User-Agent
-}
-params = {
-    "search[category]": 4,        # Character tags
-    "search[order]": "count",     # Order by post count
-    "limit": 320,                 # Max allowed
+PAGE_SIZE = 320  # Max allowed
+MAX_NUMBERED_PAGE = 750  # e621 rejects page numbers past this; deeper crawls need a cursor
+
+TAG_CATEGORIES = {
+    "general": 0,
+    "artist": 1,
+    "copyright": 3,
+    "character": 4,
+    "species": 5,
+    "invalid": 6,
+    "meta": 7,
+    "lore": 8,
 }
 
-all_tags = []
-pages_needed = (1000 // 320) + 1
-
-for i in range(pages_needed):
-    if i > 0:
-        params["page"] = i + 1    # Pagination starts from 2nd page
-    response = requests.get(BASE_URL, headers=HEADERS, params=params)
-    tags = response.json()
-    all_tags.extend(tags)
-    sleep(1.1)  # Respect rate limiting
-
-# Keep only the top 1000
-top_1000_tags = all_tags[:1000]
-
-# Write to CSV file
-with open(args.output_file, 'w', newline='', encoding='utf-8') as csvfile:
-    fieldnames = ['name', 'post_count']
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    
-    # Write header
-    writer.writeheader()
-    
-    # Write data
-    for tag in top_1000_tags:
-        writer.writerow({
-            'name': tag['name'],
-            'post_count': tag['post_count']
-        })
-
-print(f"Successfully saved {len(top_1000_tags)} character tags to {args.output_file}")
\ No newline at end of file
+
+def parse_category(value):
+    """Accept a tag category by number or by name"""
+    if str(value).isdigit():
+        return int(value)
+    try:
+        return TAG_CATEGORIES[value]
+    except KeyError:
+        raise argparse.ArgumentTypeError(f"unknown tag category: {value}")
+
+
+async def crawl_by_count(client, count, category):
+    """Yield the top `count` tags by post count, fetching numbered pages concurrently
+
+    Pages are requested a window at a time (the client's concurrency and rate
+    budget decide how many are actually in flight) and yielded in page order,
+    so rows stream out as soon as the pages before them have arrived.
+    """
+    pages_needed = -(-count // PAGE_SIZE)
+    if pages_needed > MAX_NUMBERED_PAGE:
+        raise ValueError(f"count={count} needs more than {MAX_NUMBERED_PAGE} pages; use --order id to crawl with a cursor")
+
+    def fetch(page):
+        return asyncio.create_task(client.list_tags(category=category, order="count", limit=PAGE_SIZE, page=page))
+
+    window = max(1, client.concurrency)
+    pending = [fetch(page) for page in range(1, min(window, pages_needed) + 1)]
+    next_page = len(pending) + 1
+    try:
+        while pending:
+            tags = await pending.pop(0)
+            if next_page <= pages_needed:
+                pending.append(fetch(next_page))
+                next_page += 1
+            for tag in tags:
+                yield tag
+            if len(tags) < PAGE_SIZE:
+                # Ran off the end of the list; nothing after this page exists
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def crawl_by_cursor(client, count, category):
+    """Yield up to `count` tags newest-id first, following e621's page=b<id> cursor
+
+    Cursor pages can't be fetched in parallel (each needs the last id of the
+    one before), but they have no depth limit.
+    """
+    cursor = None
+    yielded = 0
+    while yielded < count:
+        page = f"b{cursor}" if cursor is not None else 1
+        tags = await client.list_tags(category=category, order=None, limit=PAGE_SIZE, page=page)
+        for tag in tags:
+            yield tag
+        yielded += len(tags)
+        if len(tags) < PAGE_SIZE:
+            break
+        cursor = min(tag["id"] for tag in tags)
+
+
+async def crawl_tags(client, count, category=TAG_CATEGORIES["character"], order="count"):
+    """Yield up to `count` tags of a category, deduplicated by name"""
+    crawl = crawl_by_count if order == "count" else crawl_by_cursor
+    seen = set()
+    async for tag in crawl(client, count, category):
+        # Counts shift while we crawl, so a tag can slide onto the next page too
+        if tag["name"] in seen:
+            continue
+        seen.add(tag["name"])
+        yield tag
+        if len(seen) >= count:
+            break
+
+
+async def run(output_file, count=1000, category=TAG_CATEGORIES["character"], order="count",
+              concurrency=4, no_cache=False):
+    """Crawl tags and stream them to a name,post_count CSV"""
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        csv.writer(csvfile).writerow(['name', 'post_count'])
+
+        # The client keeps every page request within e621's rate limit
+        async with E621Client(concurrency=concurrency, cache=ResponseCache(), bypass_cache=no_cache) as client:
+            async with RowWriter(csvfile, total=count, label="tags") as writer:
+                index = 0
+                async for tag in crawl_tags(client, count, category, order):
+                    await writer.put(index, [tag['name'], tag['post_count']])
+                    index += 1
+            client.metrics.report("Crawl")
+
+    print(f"Successfully saved {index} tags to {output_file}")
+    return index
+
+
+def main(output_file, count=1000, category=TAG_CATEGORIES["character"], order="count", concurrency=4, no_cache=False):
+    return asyncio.run(run(output_file, count, category, order, concurrency, no_cache))
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Fetch top character tags from e621.net and save to CSV')
+    parser.add_argument('output_file', help='Path to the output CSV file')
+    parser.add_argument('--count', type=int, default=1000, help='Number of tags to fetch (default: 1000)')
+    parser.add_argument('--category', type=parse_category, default=TAG_CATEGORIES["character"],
+                        help='Tag category by name or number (default: character)')
+    parser.add_argument('--order', choices=['count', 'id'], default='count',
+                        help='count: top tags by post count (pages fetched in parallel); '
+                             'id: newest tags first via cursor pagination, no depth limit')
+    parser.add_argument('--concurrency', type=int, default=4, help='Pages in flight at once (default: 4)')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore cached API responses and re-query e621')
+    args = parser.parse_args()
+
+    main(args.output_file, args.count, args.category, args.order, args.concurrency, args.no_cache)
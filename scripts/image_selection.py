@@ -0,0 +1,280 @@
+"""Pick which rendition of which post to use as a character's image.
+
+The posts.json objects we already download carry everything needed to make
+a better choice than "first non-empty file.url": the original's byte size,
+dimensions and extension, plus e621's downscaled `sample` rendition. The
+policy walks posts in score order and takes the first acceptable candidate,
+preferring the sample when it's available and under the size cap, so rounds
+ship a few hundred KB instead of a multi-MB original at no extra API cost.
+
+The runners-up are worth keeping too: choose_many() returns the best
+rendition of the next few posts as well, and get_char_top_img.py stores them
+in a <output>_candidates.csv side file. When the chosen image dies later,
+validate_images.py promotes the next candidate and the frontend falls back
+to them in turn, neither of which needs another posts.json query.
+
+Popular posts often show several characters, so two characters can end up
+with the same file. e621 names files after their md5, which makes that an
+exact duplicate check: resolve_duplicates() leaves each image with the
+highest-count character using it and moves the others to their next
+candidate with an image nobody else has. exclusive_candidates() then drops
+the other characters' images from each fallback list, so a fallback or a
+promotion can't bring a duplicate back.
+"""
+
+import csv
+import os
+import re
+import sqlite3
+from collections import namedtuple
+
+from checkpoint import parse_int, write_csv_atomically
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+DEFAULT_MIN_DIMENSION = 300  # px, shortest side
+# Higher is better; anything not listed (webm, swf, ...) can't be shown in an <img>
+EXTENSION_PREFERENCE = {"webp": 3, "jpg": 3, "jpeg": 3, "png": 2, "gif": 1}
+DEFAULT_CANDIDATES = 5  # per character, the chosen image included
+CANDIDATE_FIELDS = ["name", "rank", "post_id", "url", "score", "size", "width", "height"]
+
+MD5_PATTERN = re.compile(r"/([0-9a-f]{32})\.(\w+)$")
+
+Candidate = namedtuple("Candidate", ["post_id", "url", "width", "height", "size", "ext", "rendition", "score"])
+
+
+def md5_from_url(url):
+    """Return (md5, extension) from an e621 file URL, or (None, None)
+
+    Samples are named after their original's md5, so both renditions of a
+    post share one key.
+    """
+    match = MD5_PATTERN.search(url or "")
+    if not match:
+        return None, None
+    return match.group(1), match.group(2).lower()
+
+
+def _ext(url, fallback=None):
+    tail = (url or "").rsplit("/", 1)[-1]
+    return tail.rsplit(".", 1)[-1].lower() if "." in tail else fallback
+
+
+def candidates_from_post(post):
+    """Return the usable renditions of a post (original first, then sample)"""
+    candidates = []
+    post_id = post.get("id")
+    score = (post.get("score") or {}).get("total")
+    file_info = post.get("file") or {}
+    if file_info.get("url"):
+        candidates.append(Candidate(post_id, file_info["url"], file_info.get("width"), file_info.get("height"),
+                                    file_info.get("size"), (file_info.get("ext") or _ext(file_info["url"])).lower(),
+                                    "file", score))
+
+    sample = post.get("sample") or {}
+    if sample.get("has") and sample.get("url"):
+        # e621 doesn't report the sample's byte size; scale the original's by pixel count
+        size = None
+        if file_info.get("size") and file_info.get("width") and file_info.get("height") and sample.get("width"):
+            ratio = (sample["width"] * (sample.get("height") or 0)) / (file_info["width"] * file_info["height"])
+            size = int(file_info["size"] * min(1.0, ratio))
+        candidates.append(Candidate(post_id, sample["url"], sample.get("width"), sample.get("height"),
+                                    size, _ext(sample["url"], "jpg"), "sample", score))
+    return candidates
+
+
+class SelectionPolicy:
+    """Scores candidates by byte size, resolution and extension"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, min_dimension=DEFAULT_MIN_DIMENSION, prefer_sample=True):
+        self.max_bytes = max_bytes
+        self.min_dimension = min_dimension
+        self.prefer_sample = prefer_sample
+
+    def acceptable(self, candidate):
+        if candidate.ext not in EXTENSION_PREFERENCE:
+            return False
+        if self.max_bytes and candidate.size is not None and candidate.size > self.max_bytes:
+            return False
+        if self.min_dimension and candidate.width and candidate.height:
+            if min(candidate.width, candidate.height) < self.min_dimension:
+                return False
+        return True
+
+    def score(self, candidate):
+        """Sort key within one post; higher is better"""
+        rendition = 1 if (candidate.rendition == "sample") == self.prefer_sample else 0
+        # Unknown sizes sort after known small ones
+        size = -(candidate.size if candidate.size is not None else self.max_bytes or 0)
+        return (rendition, EXTENSION_PREFERENCE.get(candidate.ext, 0), size)
+
+    def best(self, post):
+        """Best acceptable rendition of one post, or None"""
+        candidates = [c for c in candidates_from_post(post) if self.acceptable(c)]
+        return max(candidates, key=self.score) if candidates else None
+
+    def rank(self, posts):
+        """Best acceptable candidate of each post, in the posts' (score) order"""
+        return [c for c in (self.best(post) for post in posts) if c is not None]
+
+    def choose(self, posts):
+        """The candidate to use for a character, or None"""
+        # Posts arrive score-ordered, so the first post with an acceptable
+        # rendition wins; size and format only break ties inside a post
+        for post in posts:
+            candidate = self.best(post)
+            if candidate is not None:
+                return candidate
+
+        # Nothing met the limits; an oversized or tiny image still beats none
+        for post in posts:
+            displayable = [c for c in candidates_from_post(post) if c.ext in EXTENSION_PREFERENCE]
+            if displayable:
+                return max(displayable, key=self.score)
+        return None
+
+    def choose_many(self, posts, limit=DEFAULT_CANDIDATES):
+        """Up to `limit` candidates from different posts, best first; the first is choose()'s pick"""
+        ranked = self.rank(posts)[:limit]
+        if ranked:
+            return ranked
+        fallback = self.choose(posts)
+        return [fallback] if fallback is not None else []
+
+
+DEFAULT_POLICY = SelectionPolicy()
+
+
+def candidate_record(candidate):
+    """The JSON-friendly fields of a Candidate kept in journals and candidate files"""
+    return {"post_id": candidate.post_id, "url": candidate.url, "score": candidate.score,
+            "size": candidate.size, "width": candidate.width, "height": candidate.height}
+
+
+def candidates_path_for(images_csv):
+    root, ext = os.path.splitext(images_csv)
+    return f"{root}_candidates{ext or '.csv'}"
+
+
+def read_candidates(path):
+    """Return {name: [candidate record, ...]} in rank order ({} if there is no file)"""
+    candidates = {}
+    if not path or not os.path.exists(path):
+        return candidates
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in sorted(csv.DictReader(f), key=lambda row: parse_int(row["rank"]) or 0):
+            candidates.setdefault(row["name"], []).append(parse_candidate_row(row))
+    return candidates
+
+
+def parse_candidate_row(row):
+    """A candidate record from a row of a candidates file"""
+    return {
+        "post_id": parse_int(row.get("post_id")),
+        "url": row["url"],
+        "score": parse_int(row.get("score")),
+        "size": parse_int(row.get("size")),
+        "width": parse_int(row.get("width")),
+        "height": parse_int(row.get("height")),
+    }
+
+
+class CandidateIndex:
+    """read_candidates() for inputs too big to hold: the file indexed by name in a temporary SQLite database
+
+    Supports what the validators use of the dict, get(name, default) and
+    len() (characters with candidates). SQLite keeps only a small page cache
+    in memory and deletes the database on close(); also a context manager.
+    """
+
+    def __init__(self, path):
+        # An empty filename is a private on-disk database SQLite removes on close
+        self._conn = sqlite3.connect("")
+        self._conn.execute(f"CREATE TABLE candidates (name TEXT, rank INTEGER, {', '.join(CANDIDATE_FIELDS[2:])})")
+        if path and os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                self._conn.executemany(
+                    f"INSERT INTO candidates VALUES ({', '.join('?' for _ in CANDIDATE_FIELDS)})",
+                    ([row["name"], parse_int(row["rank"]) or 0] + [row.get(field) for field in CANDIDATE_FIELDS[2:]]
+                     for row in csv.DictReader(f)))
+        self._conn.execute("CREATE INDEX candidates_name ON candidates (name, rank)")
+        self._names = self._conn.execute("SELECT COUNT(DISTINCT name) FROM candidates").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self._names
+
+    def get(self, name, default=None):
+        rows = self._conn.execute(f"SELECT {', '.join(CANDIDATE_FIELDS[2:])} FROM candidates WHERE name = ? "
+                                  f"ORDER BY rank, rowid", (name,)).fetchall()
+        if not rows:
+            return default
+        return [parse_candidate_row(dict(zip(CANDIDATE_FIELDS[2:], row))) for row in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+def write_candidates(path, candidates):
+    """Atomically write (name, [candidate record, ...]) pairs, one row per candidate
+
+    `candidates` may be a generator, so the file can be written without
+    holding every character's list at once.
+    """
+    def rows():
+        for name, records in candidates:
+            for rank, record in enumerate(records):
+                yield [name, rank] + ["" if record.get(field) is None else record[field]
+                                      for field in CANDIDATE_FIELDS[2:]]
+
+    write_csv_atomically(path, CANDIDATE_FIELDS, rows())
+
+
+def resolve_duplicates(records):
+    """Pick replacement images for characters whose image another character already uses
+
+    `records` is a zero-argument callable returning an iterable of journal
+    records (name, image_url, post_count, candidates). It is read twice
+    rather than held in memory: once to find which character keeps each md5
+    (the one with the highest post_count, the first on ties), then for the
+    candidates of those that lose it. Losers take their best candidate whose
+    md5 nobody uses yet, in post_count order, so no character loses an image
+    it already had. Returns ({name: candidate record}, names left sharing,
+    {md5: name of the character showing it}).
+    """
+    owners = {}
+    for record in records():
+        md5, _ = md5_from_url(record.get("image_url"))
+        post_count = record.get("post_count") or 0
+        if md5 is not None and (md5 not in owners or post_count > owners[md5][0]):
+            owners[md5] = (post_count, record["name"])
+
+    losers = []
+    for record in records():
+        md5, _ = md5_from_url(record.get("image_url"))
+        if md5 is not None and owners[md5][1] != record["name"]:
+            losers.append((record.get("post_count") or 0, record["name"], record.get("candidates") or []))
+
+    taken = {md5: name for md5, (_, name) in owners.items()}
+    replacements = {}
+    shared = []
+    for _, name, candidates in sorted(losers, key=lambda loser: loser[0], reverse=True):
+        for candidate in candidates:
+            md5, _ = md5_from_url(candidate["url"])
+            if md5 is not None and md5 not in taken:
+                taken[md5] = name
+                replacements[name] = candidate
+                break
+        else:
+            shared.append(name)
+    return replacements, shared, taken
+
+
+def exclusive_candidates(name, candidates, taken):
+    """`candidates` without the ones showing another character's image (`taken` from resolve_duplicates)"""
+    return [candidate for candidate in candidates
+            if taken.get(md5_from_url(candidate["url"])[0], name) == name]
@@ -0,0 +1,223 @@
+"""Content-addressed local image store with size-capped derivatives.
+
+Each selected image is downloaded once into images/originals/, keyed by the
+md5 e621 already puts in the URL path (static1.e621.net/data/ab/cd/<md5>.png),
+and checked against that md5. A process pool then renders a small WebP (or
+JPEG) derivative into images/derived/, which server.js serves with long-lived
+cache headers. Because everything is keyed by content hash, a re-run only
+downloads and renders images it hasn't seen, and two characters sharing an
+image share one file.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import aiohttp
+from PIL import Image
+
+from e621_client import USER_AGENT
+from image_selection import md5_from_url
+from rate_limiter import TokenBucket
+from row_writer import RowWriter
+from streaming import TaskPool, count_rows, in_flight_limit, read_fieldnames, read_rows
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORE_DIR = os.path.join(REPO_ROOT, "images")
+WEB_PREFIX = "/images"
+
+DEFAULT_MAX_DIMENSION = 800  # px, longest side
+DEFAULT_FORMAT = "webp"
+DEFAULT_QUALITY = 80
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DOWNLOAD_TIMEOUT = 120
+
+FORMAT_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
+
+SAMPLE_SEGMENT = "/data/sample/"  # samples are named after the original's md5, not their own
+
+
+def original_path(store_dir, md5, ext):
+    return os.path.join(store_dir, "originals", md5[:2], md5[2:4], f"{md5}.{ext}")
+
+
+def derived_relpath(md5, max_dimension, fmt):
+    return "/".join(["derived", md5[:2], md5[2:4], f"{md5}_{max_dimension}.{FORMAT_EXTENSIONS[fmt]}"])
+
+
+def make_derivative(src, dst, max_dimension=DEFAULT_MAX_DIMENSION, fmt=DEFAULT_FORMAT, quality=DEFAULT_QUALITY):
+    """Render a size-capped copy of src to dst (runs in a worker process)"""
+    with Image.open(src) as image:
+        image.seek(0)  # first frame of anything animated
+        image.thumbnail((max_dimension, max_dimension))
+        if fmt == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = dst + ".tmp"
+        image.save(tmp, format=fmt.upper(), quality=quality)
+    os.replace(tmp, dst)
+    return os.path.getsize(dst)
+
+
+class ImageStore:
+    """Downloads originals once and renders derivatives in a process pool"""
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, max_dimension=DEFAULT_MAX_DIMENSION, fmt=DEFAULT_FORMAT,
+                 quality=DEFAULT_QUALITY, concurrency=DEFAULT_CONCURRENCY,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND, processes=None):
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported derivative format: {fmt}")
+        self.store_dir = store_dir
+        self.max_dimension = max_dimension
+        self.fmt = fmt
+        self.quality = quality
+        self.concurrency = concurrency
+        self.downloaded = 0
+        self.rendered = 0
+        self.reused = 0
+        self._bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._processes = processes
+        self._pool = None
+        self._session = None
+        self._inflight = {}
+
+    async def __aenter__(self):
+        self._pool = ProcessPoolExecutor(max_workers=self._processes)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT},
+                                              timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._pool.shutdown()
+
+    async def _download(self, url, path, md5):
+        async with self._semaphore:
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+                body = await response.read()
+        if SAMPLE_SEGMENT not in url and hashlib.md5(body).hexdigest() != md5:
+            raise ValueError(f"md5 mismatch for {url}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+        self.downloaded += 1
+
+    async def _store(self, url, md5, ext):
+        relpath = derived_relpath(md5, self.max_dimension, self.fmt)
+        derived = os.path.join(self.store_dir, *relpath.split("/"))
+        if os.path.exists(derived):
+            self.reused += 1
+            return f"{WEB_PREFIX}/{relpath}"
+
+        original = original_path(self.store_dir, md5, ext)
+        if not os.path.exists(original):
+            await self._download(url, original, md5)
+
+        await self._render(original, derived)
+        self.rendered += 1
+        return f"{WEB_PREFIX}/{relpath}"
+
+    async def _render(self, original, derived):
+        loop = asyncio.get_running_loop()
+        args = (make_derivative, original, derived, self.max_dimension, self.fmt, self.quality)
+        pool = self._pool
+        try:
+            return await loop.run_in_executor(pool, *args)
+        except BrokenProcessPool:
+            # A dead worker (out of memory on a huge image, say) fails every job queued with it.
+            # Later images get a fresh pool; this one is retried on its own, so an image that
+            # kills its worker again doesn't take any others with it.
+            if self._pool is pool:
+                self._pool = ProcessPoolExecutor(max_workers=self._processes)
+                pool.shutdown(wait=False)
+        solo = ProcessPoolExecutor(max_workers=1)
+        try:
+            return await loop.run_in_executor(solo, *args)
+        finally:
+            solo.shutdown(wait=False)
+
+    async def local_path(self, url):
+        """Return the web path of the derivative for an image URL ("" if it can't be stored)"""
+        md5, ext = md5_from_url(url)
+        if md5 is None or ext not in IMAGE_EXTENSIONS:
+            return ""
+        # Characters that share an image share one download and one render; once it
+        # is done the derivative is on disk and later rows find it there
+        if md5 not in self._inflight:
+            self._inflight[md5] = asyncio.ensure_future(self._store(url, md5, ext))
+            self._inflight[md5].add_done_callback(lambda _: self._inflight.pop(md5, None))
+        try:
+            return await asyncio.shield(self._inflight[md5])
+        except Exception as e:
+            # Anything from one image (bad download, decompression bomb, a crashed
+            # worker) costs only that row its local_image, not the whole run
+            print(f"Could not store {url}: {e or type(e).__name__}")
+            return ""
+
+
+async def run(input_csv, output_csv, store_dir=DEFAULT_STORE_DIR, max_dimension=DEFAULT_MAX_DIMENSION,
+              fmt=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, concurrency=DEFAULT_CONCURRENCY, processes=None):
+    """Store every image in input_csv and write its rows back out with a local_image column"""
+    total = count_rows(input_csv)
+    fieldnames = [f for f in read_fieldnames(input_csv) if f != "local_image"] + ["local_image"]
+
+    print(f"Storing {total} images in {store_dir} ({fmt}, max {max_dimension}px)...")
+    # Rows are read while the output is written, so it goes to a temporary file
+    # first; output_csv may be input_csv itself
+    tmp_path = output_csv + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as outfile:
+        csv.writer(outfile).writerow(fieldnames)
+        async with ImageStore(store_dir, max_dimension, fmt, quality, concurrency, processes=processes) as store, \
+                RowWriter(outfile, total=total, ordered=True, label="images") as writer, \
+                TaskPool(in_flight_limit(concurrency)) as pool:
+            async def handle(index, row):
+                url = (row.get("image_url") or "").strip()
+                row["local_image"] = await store.local_path(url) if url else ""
+                await writer.put(index, [row.get(field, "") for field in fieldnames])
+
+            for index, row in enumerate(read_rows(input_csv)):
+                await pool.submit(handle(index, row))
+    os.replace(tmp_path, output_csv)
+
+    print(f"Downloaded {store.downloaded}, rendered {store.rendered}, reused {store.reused} derivatives")
+    print(f"Output written to: {output_csv}")
+
+
+def main(input_csv, output_csv, store_dir=DEFAULT_STORE_DIR, max_dimension=DEFAULT_MAX_DIMENSION,
+         fmt=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, concurrency=DEFAULT_CONCURRENCY, processes=None):
+    asyncio.run(run(input_csv, output_csv, store_dir, max_dimension, fmt, quality, concurrency, processes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download selected images once and build small local derivatives")
+    parser.add_argument("input_csv", help="CSV with name and image_url columns (e.g. top_img.csv)")
+    parser.add_argument("output_csv", help="CSV to write the input rows plus a local_image column to")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="Image store root (default: <repo>/images)")
+    parser.add_argument("--max-dimension", type=int, default=DEFAULT_MAX_DIMENSION,
+                        help=f"Longest side of derivatives in px (default: {DEFAULT_MAX_DIMENSION})")
+    parser.add_argument("--format", choices=sorted(FORMAT_EXTENSIONS), default=DEFAULT_FORMAT,
+                        help=f"Derivative format (default: {DEFAULT_FORMAT})")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY,
+                        help=f"Encoder quality (default: {DEFAULT_QUALITY})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Downloads in flight at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--processes", type=int, help="Worker processes for rendering (default: CPU count)")
+    args = parser.parse_args()
+
+    main(args.input_csv, args.output_csv, args.store_dir, args.max_dimension, args.format, args.quality,
+         args.concurrency, args.processes)
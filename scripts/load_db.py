@@ -0,0 +1,249 @@
+"""Load scraper output into database.sqlite in one transaction.
+
+Replaces the old seed.js path (re-parse both CSVs, DELETE FROM characters,
+then one un-batched async INSERT per row). Rows are streamed into a staging
+table with executemany() inside a single transaction, and the staging table
+is swapped in place of `characters` in that same transaction. The database
+runs in WAL mode, so server.js keeps reading the old table until the commit
+and never sees a half-empty one.
+
+The same transaction rebuilds `round_pool`, a dense slot -> character table
+sorted by post_count, where every slot also records the range of slots
+sharing its post_count. /api/get-round picks a random slot, then a random
+slot outside that range, so a round is two primary-key lookups however
+many characters are loaded instead of a self-join over all N² pairs. The
+easy/medium/hard pools from round_pairs.py are rebuilt alongside it, as is
+`image_candidates`, the ranked fallback images from get_char_top_img.py that
+/api/get-round hands to the frontend.
+"""
+
+import argparse
+import csv
+import os
+import sqlite3
+import time
+from collections import Counter
+
+from checkpoint import parse_int
+from image_selection import candidates_path_for, read_candidates
+from round_pairs import DEFAULT_PAIRS_PER_BUCKET, DIFFICULTIES, PAIRS_TABLE, build_pair_pools
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(SCRIPTS_DIR)
+DEFAULT_DB_PATH = os.path.join(REPO_ROOT, "database.sqlite")
+DEFAULT_CHARACTERS_CSV = os.path.join(SCRIPTS_DIR, "characters.csv")
+DEFAULT_IMAGES_CSV = os.path.join(SCRIPTS_DIR, "top_img.csv")
+
+TABLE = "characters"
+STAGING_TABLE = "characters_staging"
+POOL_TABLE = "round_pool"
+POOL_STAGING_TABLE = "round_pool_staging"
+PAIRS_STAGING_TABLE = "round_pairs_staging"
+CANDIDATES_TABLE = "image_candidates"
+CANDIDATES_STAGING_TABLE = "image_candidates_staging"
+COLUMNS = ["name", "post_count", "image_url", "local_image", "image_width", "image_height"]
+
+
+def create_table_sql(table):
+    # Keep in step with the CREATE TABLE in server.js
+    return f"""
+        CREATE TABLE {table} (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          name VARCHAR(255) NOT NULL,
+          post_count INTEGER NOT NULL,
+          image_url TEXT,
+          local_image TEXT,
+          image_width INTEGER,
+          image_height INTEGER
+        )
+    """
+
+
+def create_pool_sql(table):
+    return f"""
+        CREATE TABLE {table} (
+          slot INTEGER PRIMARY KEY,
+          character_id INTEGER NOT NULL,
+          group_start INTEGER NOT NULL,
+          group_size INTEGER NOT NULL
+        )
+    """
+
+
+def create_candidates_sql(table):
+    return f"""
+        CREATE TABLE {table} (
+          character_id INTEGER NOT NULL,
+          rank INTEGER NOT NULL,
+          post_id INTEGER,
+          url TEXT NOT NULL,
+          score INTEGER,
+          size INTEGER,
+          width INTEGER,
+          height INTEGER,
+          PRIMARY KEY (character_id, rank)
+        ) WITHOUT ROWID
+    """
+
+
+def pool_rows(characters):
+    """Turn (id, post_count) pairs sorted by post_count into round_pool rows"""
+    group_sizes = Counter(post_count for _, post_count in characters)
+    group_start = 0
+    for slot, (character_id, post_count) in enumerate(characters):
+        if slot and post_count != characters[slot - 1][1]:
+            group_start = slot
+        yield slot, character_id, group_start, group_sizes[post_count]
+
+
+def build_round_pool(conn, source_table, pool_table):
+    """Create pool_table from the characters in source_table"""
+    characters = conn.execute(f"SELECT id, post_count FROM {source_table} ORDER BY post_count, id").fetchall()
+    conn.execute(f"DROP TABLE IF EXISTS {pool_table}")
+    conn.execute(create_pool_sql(pool_table))
+    conn.executemany(f"INSERT INTO {pool_table} VALUES (?, ?, ?, ?)", pool_rows(characters))
+
+
+def build_candidates(conn, source_table, candidates_table, candidates):
+    """Create candidates_table from {name: [candidate record, ...]}; returns the row count"""
+    conn.execute(f"DROP TABLE IF EXISTS {candidates_table}")
+    conn.execute(create_candidates_sql(candidates_table))
+    rows = ((character_id, rank, c["post_id"], c["url"], c["score"], c["size"], c["width"], c["height"])
+            for character_id, name in conn.execute(f"SELECT id, name FROM {source_table}").fetchall()
+            for rank, c in enumerate(candidates.get(name, [])))
+    conn.executemany(f"INSERT INTO {candidates_table} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return conn.execute(f"SELECT COUNT(*) FROM {candidates_table}").fetchone()[0]
+
+
+def swap_table(conn, staging_table, table):
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(f"ALTER TABLE {staging_table} RENAME TO {table}")
+
+
+def rebuild_round_pools(conn, pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None):
+    """Rebuild round_pool and round_pairs from the live characters table
+
+    Runs inside the caller's transaction; returns {difficulty: pair count}.
+    """
+    build_round_pool(conn, TABLE, POOL_STAGING_TABLE)
+    pair_counts = build_pair_pools(conn, TABLE, PAIRS_STAGING_TABLE, pairs_per_bucket, seed)
+    swap_table(conn, POOL_STAGING_TABLE, POOL_TABLE)
+    swap_table(conn, PAIRS_STAGING_TABLE, PAIRS_TABLE)
+    return pair_counts
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    """Open the game database in WAL mode (autocommit; transactions are explicit)"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def read_images(images_csv=DEFAULT_IMAGES_CSV):
+    """Map character name -> image fields from a get_char_top_img.py CSV"""
+    images = {}
+    if not images_csv or not os.path.exists(images_csv):
+        return images
+    with open(images_csv, newline="", encoding="utf-8") as infile:
+        for row in csv.DictReader(infile):
+            images[row["name"]] = row
+    return images
+
+
+def character_rows(characters_csv=DEFAULT_CHARACTERS_CSV, images=None, stats=None):
+    """Yield one insert tuple per valid characters.csv row, joined with its image"""
+    images = images or {}
+    with open(characters_csv, newline="", encoding="utf-8") as infile:
+        for row in csv.DictReader(infile):
+            name = (row.get("name") or "").strip()
+            post_count = parse_int(row.get("post_count"))
+            if not name or post_count is None:
+                if stats is not None:
+                    stats["skipped"] = stats.get("skipped", 0) + 1
+                continue
+            image = images.get(name, {})
+            yield (name, post_count, image.get("image_url") or None, image.get("local_image") or None,
+                   parse_int(image.get("image_width")), parse_int(image.get("image_height")))
+
+
+def load_characters(conn, rows, pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None, candidates=None):
+    """Replace the characters table (and its round pools and candidates) with `rows` atomically
+
+    Returns (row count, {difficulty: pair count}, candidate count).
+    """
+    placeholders = ", ".join("?" for _ in COLUMNS)
+    # BEGIN IMMEDIATE takes the write lock up front; WAL readers carry on
+    # against the last committed snapshot until COMMIT
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        conn.execute(create_table_sql(STAGING_TABLE))
+        conn.executemany(f"INSERT INTO {STAGING_TABLE} ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+        count = conn.execute(f"SELECT COUNT(*) FROM {STAGING_TABLE}").fetchone()[0]
+        build_round_pool(conn, STAGING_TABLE, POOL_STAGING_TABLE)
+        pair_counts = build_pair_pools(conn, STAGING_TABLE, PAIRS_STAGING_TABLE, pairs_per_bucket, seed)
+        candidate_count = build_candidates(conn, STAGING_TABLE, CANDIDATES_STAGING_TABLE, candidates or {})
+
+        swap_table(conn, STAGING_TABLE, TABLE)
+        swap_table(conn, POOL_STAGING_TABLE, POOL_TABLE)
+        swap_table(conn, PAIRS_STAGING_TABLE, PAIRS_TABLE)
+        swap_table(conn, CANDIDATES_STAGING_TABLE, CANDIDATES_TABLE)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_post_count ON {TABLE}(post_count)")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return count, pair_counts, candidate_count
+
+
+def run(db_path=DEFAULT_DB_PATH, characters_csv=DEFAULT_CHARACTERS_CSV, images_csv=DEFAULT_IMAGES_CSV,
+        pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None, candidates_csv=None):
+    """Load characters_csv (+ images_csv and its candidates) into db_path; returns the number of rows loaded"""
+    started = time.perf_counter()
+    stats = {"skipped": 0}
+    images = read_images(images_csv)
+    if candidates_csv is None and images_csv:
+        candidates_csv = candidates_path_for(images_csv)
+    candidates = read_candidates(candidates_csv)
+
+    conn = connect(db_path)
+    try:
+        count, pair_counts, candidate_count = load_characters(conn, character_rows(characters_csv, images, stats),
+                                                              pairs_per_bucket, seed, candidates)
+        # Fold the WAL back into the main file so database.sqlite is complete on its own
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        with_images = conn.execute(f"SELECT COUNT(*) FROM {TABLE} WHERE image_url IS NOT NULL").fetchone()[0]
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {count} characters ({with_images} with images, {stats['skipped']} skipped) "
+          f"into {db_path} in {elapsed:.2f}s")
+    print("Round pairs: " + ", ".join(f"{name}={pair_counts[name]}" for name, _, _ in DIFFICULTIES))
+    print(f"Image candidates: {candidate_count}")
+    return count
+
+
+def main(db_path=DEFAULT_DB_PATH, characters_csv=DEFAULT_CHARACTERS_CSV, images_csv=DEFAULT_IMAGES_CSV,
+         pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None, candidates_csv=None):
+    return run(db_path, characters_csv, images_csv, pairs_per_bucket, seed, candidates_csv)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load character and image CSVs into the game database")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database to load (default: <repo>/database.sqlite)")
+    parser.add_argument("--characters", default=DEFAULT_CHARACTERS_CSV,
+                        help="CSV with name and post_count columns (default: scripts/characters.csv)")
+    parser.add_argument("--images", default=DEFAULT_IMAGES_CSV,
+                        help="CSV with name, image_url and optional local_image/image_width/image_height "
+                             "columns (default: scripts/top_img.csv)")
+    parser.add_argument("--candidates",
+                        help="Ranked fallback images from get_char_top_img.py (default: <images>_candidates.csv)")
+    parser.add_argument("--pairs", type=int, default=DEFAULT_PAIRS_PER_BUCKET,
+                        help=f"Round pairs per difficulty (default: {DEFAULT_PAIRS_PER_BUCKET})")
+    parser.add_argument("--seed", type=int, help="Random seed for the difficulty pools, for reproducible loads")
+    args = parser.parse_args()
+
+    main(args.db, args.characters, args.images, args.pairs, args.seed, args.candidates)
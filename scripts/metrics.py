@@ -0,0 +1,122 @@
+"""Structured run metrics shared by the scrapers.
+
+Instead of printing as things happen, the scripts record into one
+process-wide Metrics object:
+
+- spans: timed operations such as one HTTP exchange, broken into phases
+  (queued for a pooled connection, DNS, connect, time to first byte, total)
+- counters: outcomes such as lookup.ok, lookup.no_posts, lookup.login_required,
+  lookup.http_error, lookup.exception, cache.hit, http.429
+- histograms: small integer distributions such as retries per request
+
+Every span and event is written as one JSON line to the file named by
+E621_METRICS_FILE (buffered, so the hot path never waits on the console),
+and report() prints a short summary at the end of a run and writes it as a
+final {"summary": ...} line.
+"""
+
+import atexit
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+METRICS_FILE_ENV = "E621_METRICS_FILE"
+SPAN_PHASES = ["queued", "dns", "connect", "ttfb", "total"]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+class Metrics:
+    """Counters, histograms and span timings, optionally streamed as JSON lines"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.counters = Counter()
+        self.histograms = defaultdict(Counter)
+        self.timings = defaultdict(list)  # "span.phase" -> seconds
+        self.started = time.monotonic()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def incr(self, name, value=1):
+        self.counters[name] += value
+
+    def observe(self, name, value):
+        self.histograms[name][value] += 1
+
+    def span(self, name, phases, **fields):
+        """Record one timed operation; `phases` maps phase name -> seconds (None if it didn't happen)"""
+        for phase, seconds in phases.items():
+            if seconds is not None:
+                self.timings[f"{name}.{phase}"].append(seconds)
+        if self._file is not None:
+            self.emit({"span": name, **fields, **{f"{phase}_ms": _ms(s) for phase, s in phases.items()}})
+
+    def event(self, name, **fields):
+        """Count an event and, if a metrics file is open, log it with its details"""
+        self.incr(name)
+        if self._file is not None:
+            self.emit({"event": name, **fields})
+
+    def emit(self, record):
+        if self._file is not None:
+            self._file.write(json.dumps({"t": round(time.time(), 3), **record}, default=str) + "\n")
+
+    def summary(self):
+        spans = {}
+        for name, values in sorted(self.timings.items()):
+            spans[name] = {"count": len(values), "p50_ms": _ms(percentile(values, 0.50)),
+                           "p90_ms": _ms(percentile(values, 0.90)), "p99_ms": _ms(percentile(values, 0.99)),
+                           "max_ms": _ms(max(values))}
+        return {
+            "elapsed_s": round(time.monotonic() - self.started, 3),
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {name: dict(sorted(counts.items())) for name, counts in sorted(self.histograms.items())},
+            "spans": spans,
+        }
+
+    def report(self, label="Run"):
+        """Print a short summary and write it to the metrics file"""
+        summary = self.summary()
+        self.emit({"summary": summary, "label": label})
+        if self._file is not None:
+            self._file.flush()
+
+        print(f"{label} summary ({summary['elapsed_s']:.1f}s):")
+        for name, stats in summary["spans"].items():
+            print(f"  {name}: n={stats['count']} p50={stats['p50_ms']}ms p90={stats['p90_ms']}ms "
+                  f"p99={stats['p99_ms']}ms max={stats['max_ms']}ms")
+        if summary["counters"]:
+            print("  " + " ".join(f"{name}={count}" for name, count in summary["counters"].items()))
+        for name, counts in summary["histograms"].items():
+            print(f"  {name}: " + " ".join(f"{value}={count}" for value, count in counts.items()))
+        if self.path:
+            print(f"  metrics written to {self.path}")
+        return summary
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_metrics = None
+
+
+def get_metrics():
+    """The process-wide Metrics, writing to E621_METRICS_FILE if that is set"""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics(os.environ.get(METRICS_FILE_ENV) or None)
+        atexit.register(_metrics.close)
+    return _metrics
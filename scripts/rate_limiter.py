@@ -0,0 +1,81 @@
+"""Token bucket and retry backoff shared by every request the e621 client sends."""
+
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_CAP = 30.0  # seconds
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursting up to `capacity`
+
+    One bucket is shared by every task using a client, so the combined request
+    rate stays at the ceiling no matter how many workers are in flight. A 429
+    pauses the whole bucket rather than a single worker.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        # Holding the lock while sleeping keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (e.g. from a Retry-After header)"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        # Don't let a full bucket turn into a burst as soon as the pause ends
+        self._tokens = min(self._tokens, 1.0)
+        self._updated = max(self._updated, self._paused_until)
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds from a Retry-After header, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, retry_after=None, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,113 @@
+"""Persistent on-disk cache for e621 API responses.
+
+Responses are stored zlib-compressed in a small SQLite database, keyed by
+endpoint + query params. Entries younger than the TTL are served without any
+network traffic; older ones are revalidated with If-None-Match /
+If-Modified-Since so an unchanged answer costs a cheap 304. When the cache
+grows past `max_bytes` the least recently used entries are evicted.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from collections import namedtuple
+from urllib.parse import urlencode
+
+# E621_CACHE_PATH keeps runs against a fake server (benchmark.py) out of the real cache
+DEFAULT_CACHE_PATH = os.environ.get("E621_CACHE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                       ".e621_cache.sqlite")
+DEFAULT_TTL = 6 * 60 * 60  # seconds
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+CacheEntry = namedtuple("CacheEntry", ["body", "etag", "last_modified", "fetched_at"])
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL, conditional revalidation and LRU eviction"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(endpoint, params=None, identity=None):
+        """Stable cache key for a request; `identity` separates logged-in results"""
+        query = urlencode(sorted((params or {}).items()))
+        raw = f"{identity or ''}|{endpoint}?{query}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached CacheEntry for a key, or None"""
+        row = self._conn.execute(
+            "SELECT body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        body, etag, last_modified, fetched_at = row
+        return CacheEntry(zlib.decompress(body), etag, last_modified, fetched_at)
+
+    def is_fresh(self, entry):
+        return time.time() - entry.fetched_at < self.ttl
+
+    def put(self, key, body, etag=None, last_modified=None):
+        """Store a response body and evict old entries if we're over budget"""
+        compressed = zlib.compress(body)
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, body, size, etag, last_modified, fetched_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, compressed, len(compressed), etag, last_modified, now, now),
+        )
+        self._conn.commit()
+        self.evict()
+
+    def touch(self, key):
+        """Mark an entry as freshly validated (after a 304 Not Modified)"""
+        now = time.time()
+        self._conn.execute("UPDATE responses SET fetched_at = ?, last_used = ? WHERE key = ?", (now, now, key))
+        self._conn.commit()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._conn.commit()
+
+    def clear(self):
+        self._conn.execute("DELETE FROM responses")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
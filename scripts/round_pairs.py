@@ -0,0 +1,119 @@
+"""Difficulty-bucketed round pairs.
+
+A round is hard when the two post counts are close and easy when one
+character has many times the posts of the other, so difficulty is the log
+of the post_count ratio. Scoring all N² pairs doesn't scale, so pairs are
+sampled: characters are sorted by post_count, each sample takes a random
+anchor and a partner a log-uniformly distributed number of places further
+along (near neighbours give near-ties, long jumps give lopsided rounds), and
+whole batches of samples are scored and bucketed with NumPy at once.
+
+load_db.py writes the buckets to `round_pairs`, keyed by (difficulty, slot),
+so /api/get-round?difficulty=hard is one random primary-key lookup just like
+a plain random round.
+
+NumPy is optional for loading the database: without it the pools are left
+empty and the server answers difficulty requests with plain random rounds.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PAIRS_TABLE = "round_pairs"
+DEFAULT_PAIRS_PER_BUCKET = 5000
+MAX_SAMPLING_ROUNDS = 20
+
+# (name, lowest ratio, highest ratio), ratio = larger post_count / smaller post_count
+DIFFICULTIES = [
+    ("hard", 1.0, 1.5),
+    ("medium", 1.5, 4.0),
+    ("easy", 4.0, math.inf),
+]
+
+
+def create_pairs_sql(table):
+    return f"""
+        CREATE TABLE {table} (
+          difficulty TEXT NOT NULL,
+          slot INTEGER NOT NULL,
+          character_a INTEGER NOT NULL,
+          character_b INTEGER NOT NULL,
+          PRIMARY KEY (difficulty, slot)
+        ) WITHOUT ROWID
+    """
+
+
+def sample_pairs(post_counts, pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None):
+    """Return {difficulty: (k, 2) array of indices into post_counts}
+
+    Each bucket holds up to pairs_per_bucket distinct pairs with different
+    post counts, in random order and with a random side for each character.
+    Small pools may not have enough pairs to fill every bucket.
+    """
+    counts = np.asarray(post_counts, dtype=np.float64)
+    n = len(counts)
+    buckets = {name: np.empty((0, 2), dtype=np.int64) for name, _, _ in DIFFICULTIES}
+    if n < 2:
+        return buckets
+
+    rng = np.random.default_rng(seed)
+    order = np.argsort(counts, kind="stable")
+    log_counts = np.log(np.maximum(counts[order], 1.0))
+    edges = np.log([low for _, low, _ in DIFFICULTIES[1:]])
+    batch = pairs_per_bucket * len(DIFFICULTIES) * 2
+
+    for _ in range(MAX_SAMPLING_ROUNDS):
+        low = rng.integers(0, n - 1, size=batch)
+        offset = np.exp(rng.uniform(0.0, np.log(n), size=batch)).astype(np.int64)
+        high = low + np.maximum(offset, 1)
+        in_range = high < n
+        low, high = low[in_range], high[in_range]
+
+        ratio = log_counts[high] - log_counts[low]  # >= 0, the list is sorted
+        distinct = ratio > 0
+        low, high, ratio = low[distinct], high[distinct], ratio[distinct]
+        bucket_of = np.searchsorted(edges, ratio, side="right")
+
+        for index, (name, _, _) in enumerate(DIFFICULTIES):
+            pairs = np.concatenate([buckets[name], np.stack([low, high], axis=1)[bucket_of == index]])
+            # Drop repeats but keep the order they were drawn in
+            _, first = np.unique(pairs[:, 0] * n + pairs[:, 1], return_index=True)
+            buckets[name] = pairs[np.sort(first)][:pairs_per_bucket]
+
+        if all(len(pairs) >= pairs_per_bucket for pairs in buckets.values()):
+            break
+
+    for name, pairs in buckets.items():
+        # Back to caller indices, with the higher count on a random side
+        pairs = order[pairs]
+        flip = rng.random(len(pairs)) < 0.5
+        pairs[flip] = pairs[flip][:, ::-1]
+        buckets[name] = pairs
+    return buckets
+
+
+def build_pair_pools(conn, source_table, pairs_table, pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None):
+    """Create pairs_table from the characters in source_table; returns {difficulty: pair count}"""
+    if np is None:
+        conn.execute(f"DROP TABLE IF EXISTS {pairs_table}")
+        conn.execute(create_pairs_sql(pairs_table))
+        print("NumPy is not installed; skipping the difficulty pools (pip install -r scripts/requirements.txt)")
+        return {name: 0 for name, _, _ in DIFFICULTIES}
+
+    characters = conn.execute(f"SELECT id, post_count FROM {source_table}").fetchall()
+    ids = np.array([character_id for character_id, _ in characters], dtype=np.int64)
+    buckets = sample_pairs([post_count for _, post_count in characters], pairs_per_bucket, seed)
+
+    conn.execute(f"DROP TABLE IF EXISTS {pairs_table}")
+    conn.execute(create_pairs_sql(pairs_table))
+    sizes = {}
+    for name, pairs in buckets.items():
+        pair_ids = ids[pairs]
+        conn.executemany(f"INSERT INTO {pairs_table} VALUES (?, ?, ?, ?)",
+                         ((name, slot, int(a), int(b)) for slot, (a, b) in enumerate(pair_ids)))
+        sizes[name] = len(pairs)
+    return sizes
@@ -0,0 +1,146 @@
+"""Single writer stage for the scrapers' CSV output.
+
+Workers hand finished rows to a bounded queue instead of writing under a
+lock. One consumer task owns the output file (and the checkpoint journal),
+writes rows in batches, flushes + fsyncs at intervals so a crash loses at
+most one interval, can restore input order, and prints a single structured
+progress line every few seconds instead of one print per row. Both timers
+also fire while the queue is idle, e.g. during a slow lookup.
+"""
+
+import asyncio
+import csv
+import os
+import time
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_FLUSH_ROWS = 200
+DEFAULT_FLUSH_INTERVAL = 2.0  # seconds
+DEFAULT_PROGRESS_INTERVAL = 5.0  # seconds
+DEFAULT_REORDER_WINDOW = 4096  # rows held back at most while waiting for an earlier one
+
+_DONE = object()
+
+
+class RowWriter:
+    """Bounded-queue writer stage; use as an async context manager
+
+        async with RowWriter(outfile, journal=journal, total=len(rows)) as writer:
+            await writer.put(index, [name, url], record)
+
+    `outfile` may be None when only the journal is written. With ordered=True
+    rows are written in `index` order no matter which worker finishes first.
+    `record` is an optional dict of CheckpointJournal.append() fields.
+
+    Ordered writers hold finished rows back until the rows before them are
+    in. To keep that buffer bounded, put() waits while `index` is
+    reorder_window or more rows ahead of the next row to be written, so a
+    slow lookup stalls the producer instead of piling up later rows. Every
+    index must eventually be put, and in the order the producer hands them out.
+    """
+
+    def __init__(self, outfile, journal=None, total=None, ordered=False, label="rows",
+                 queue_size=DEFAULT_QUEUE_SIZE, flush_rows=DEFAULT_FLUSH_ROWS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, progress_interval=DEFAULT_PROGRESS_INTERVAL,
+                 reorder_window=DEFAULT_REORDER_WINDOW):
+        self.outfile = outfile
+        self.journal = journal
+        self.total = total
+        self.ordered = ordered
+        self.label = label
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.progress_interval = progress_interval
+        self.reorder_window = reorder_window
+        self.written = 0
+        self.empty = 0
+        self._csv = csv.writer(outfile) if outfile is not None else None
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._pending = {}
+        self._next_index = 0
+        self._advanced = asyncio.Event()
+        self._unflushed = 0
+        self._task = None
+
+    async def __aenter__(self):
+        self._started = self._last_flush = self._last_progress = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._queue.put(_DONE)
+        await self._task
+        self.progress(final=True)
+
+    async def put(self, index, row, record=None):
+        """Queue a finished row; waits while the queue is full or the row is too far ahead"""
+        while self.ordered and index - self._next_index >= self.reorder_window and not self._task.done():
+            self._advanced.clear()
+            await self._advanced.wait()
+        await self._queue.put((index, row, record))
+
+    async def _run(self):
+        while True:
+            try:
+                item = await asyncio.wait_for(self._queue.get(), self._idle_timeout())
+            except asyncio.TimeoutError:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                index, row, record = item
+                if self.ordered:
+                    self._pending[index] = (row, record)
+                    while self._next_index in self._pending:
+                        self._write(*self._pending.pop(self._next_index))
+                        self._next_index += 1
+                        self._advanced.set()
+                else:
+                    self._write(row, record)
+
+            now = time.monotonic()
+            if self._unflushed >= self.flush_rows or now - self._last_flush >= self.flush_interval:
+                await self._flush()
+            if now - self._last_progress >= self.progress_interval:
+                self.progress()
+
+        # Anything still held back is waiting on an index that never arrived
+        for index in sorted(self._pending):
+            self._write(*self._pending[index])
+        self._pending.clear()
+        await self._flush()
+
+    def _idle_timeout(self):
+        """Seconds until the next flush or progress line is due"""
+        deadline = min(self._last_flush + self.flush_interval, self._last_progress + self.progress_interval)
+        return max(0.0, deadline - time.monotonic())
+
+    def _write(self, row, record):
+        if self._csv is not None:
+            self._csv.writerow(row)
+        if self.journal is not None and record is not None:
+            self.journal.append(**record, sync=False)
+        self.written += 1
+        # Every CSV we write has the interesting value (usually image_url) second
+        if len(row) > 1 and row[1] in ("", None):
+            self.empty += 1
+        self._unflushed += 1
+
+    async def _flush(self):
+        if self._unflushed:
+            files = [f for f in (self.outfile, self.journal and self.journal.file) if f is not None]
+            for f in files:
+                f.flush()
+            await asyncio.to_thread(lambda: [os.fsync(f.fileno()) for f in files])
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def progress(self, final=False):
+        elapsed = time.monotonic() - self._started
+        rate = self.written / elapsed if elapsed > 0 else 0.0
+        done = f"{self.written}/{self.total}" if self.total is not None else str(self.written)
+        line = f"progress {self.label}={done} empty={self.empty} rate={rate:.1f}/s elapsed={elapsed:.1f}s"
+        if not final and self.total and rate > 0:
+            line += f" eta={(self.total - self.written) / rate:.0f}s"
+        print(line, flush=True)
+        self._last_progress = time.monotonic()
@@ -0,0 +1,91 @@
+"""Lazy CSV input and bounded task scheduling for the scrapers.
+
+Reading a whole CSV into a list and creating one task per row up front keeps
+every row dict, coroutine and future alive at once, which grows without
+limit at 100k+ characters. Instead rows are read one at a time, and
+a TaskPool only starts the next job once one of at most `limit` running
+jobs has finished, so memory stays flat however long the input is.
+"""
+
+import asyncio
+import csv
+from itertools import islice
+
+DEFAULT_IN_FLIGHT_PER_WORKER = 2  # queued jobs per worker, enough to keep every connection busy
+
+
+def in_flight_limit(max_workers, per_worker=DEFAULT_IN_FLIGHT_PER_WORKER):
+    return max(1, max_workers) * per_worker
+
+
+def read_rows(path):
+    """Yield the rows of a CSV as dicts, one at a time"""
+    with open(path, newline="", encoding="utf-8") as infile:
+        yield from csv.DictReader(infile)
+
+
+def read_fieldnames(path):
+    with open(path, newline="", encoding="utf-8") as infile:
+        return csv.DictReader(infile).fieldnames or []
+
+
+def count_rows(path, predicate=None):
+    """Count the rows of a CSV (that satisfy predicate) without keeping them"""
+    return sum(1 for row in read_rows(path) if predicate is None or predicate(row))
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` consecutive items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class TaskPool:
+    """At most `limit` tasks in flight; use as an async context manager
+
+        async with TaskPool(limit) as pool:
+            for row in read_rows(path):
+                await pool.submit(process(row))
+
+    submit() waits for a free slot before starting the coroutine, so the
+    producer never runs more than `limit` jobs ahead. Leaving the block waits
+    for the remaining jobs; the first exception raised by a job cancels the
+    rest and is re-raised.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._running = set()
+        self._errors = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None and not self._errors and self._running:
+            await asyncio.wait(set(self._running))
+        for task in self._running:
+            task.cancel()
+        if exc_type is None and self._errors:
+            raise self._errors[0]
+
+    def _finished(self, task):
+        self._running.discard(task)
+        self._semaphore.release()
+        if not task.cancelled() and task.exception() is not None:
+            self._errors.append(task.exception())
+
+    async def submit(self, coro):
+        await self._semaphore.acquire()
+        if self._errors:
+            coro.close()
+            self._semaphore.release()
+            raise self._errors[0]
+        task = asyncio.create_task(coro)
+        self._running.add(task)
+        task.add_done_callback(self._finished)
@@ -0,0 +1,176 @@
+"""Refresh post counts in database.sqlite without re-running the pipeline.
+
+Counts drift every day, but the characters, their images and candidates
+don't. Instead of get_chars.py -> get_char_top_img.py -> load_db.py, this
+re-reads only the count-ordered tags.json pages that cover the loaded
+characters: it stops at the first tag below the watermark, the lowest
+post_count in the game (less a safety margin). That is ceil(N / 320) + a
+page or two of requests, for example 4-5 for the top 1000. Only the counts that
+changed are written, and round_pool/round_pairs are rebuilt in the same
+transaction, so the game is reranked locally.
+
+tags.json can't be ordered by update time, and a tag's updated_at doesn't
+follow its post_count, so there is no delta cursor to resume from: every
+sync recomputes the watermark from the database and re-reads every page
+down to it. The count order is simply the cheapest complete signal. Cached
+responses are never used for this, though fresh ones are still stored. A
+`sync_state` table records the last sync (time, watermark, requests, changes)
+for the next run to report; nothing is read back from it.
+
+With --rerank-csv, tags that climbed above the watermark but aren't in the
+game yet are merged into characters.csv, which is re-sorted and cut back to
+its top N; a get_char_top_img.py --incremental run then only looks those up.
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import time
+
+from checkpoint import parse_int, write_csv_atomically
+from e621_client import E621Client
+from get_chars import PAGE_SIZE, TAG_CATEGORIES, crawl_tags
+from load_db import DEFAULT_CHARACTERS_CSV, DEFAULT_DB_PATH, TABLE, connect, rebuild_round_pools
+from response_cache import ResponseCache
+from round_pairs import DEFAULT_PAIRS_PER_BUCKET, DIFFICULTIES
+
+STATE_TABLE = "sync_state"
+DEFAULT_MARGIN = 0.10  # also re-read tags up to 10% below the lowest count, to catch ones that slipped
+DEFAULT_CONCURRENCY = 2
+
+
+def read_state(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+    return dict(conn.execute(f"SELECT key, value FROM {STATE_TABLE}").fetchall())
+
+
+def write_state(conn, **values):
+    conn.executemany(f"INSERT OR REPLACE INTO {STATE_TABLE} (key, value) VALUES (?, ?)",
+                     ((key, str(value)) for key, value in values.items()))
+
+
+async def fetch_counts(client, watermark, max_tags, category=TAG_CATEGORIES["character"]):
+    """Return {name: post_count} for the top tags down to `watermark`"""
+    counts = {}
+    async for tag in crawl_tags(client, max_tags, category, "count"):
+        if tag["post_count"] < watermark:
+            break
+        counts[tag["name"]] = tag["post_count"]
+    return counts
+
+
+def apply_counts(conn, counts, state, pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None):
+    """Write the changed post counts and rerank the round pools in one transaction
+
+    Returns (changed rows, {difficulty: pair count} or None when nothing changed).
+    """
+    rows = conn.execute(f"SELECT id, name, post_count FROM {TABLE}").fetchall()
+    changed = [(counts[name], character_id) for character_id, name, post_count in rows
+               if name in counts and counts[name] != post_count]
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        pair_counts = None
+        if changed:
+            conn.executemany(f"UPDATE {TABLE} SET post_count = ? WHERE id = ?", changed)
+            pair_counts = rebuild_round_pools(conn, pairs_per_bucket, seed)
+        write_state(conn, **state, changed=len(changed))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return changed, pair_counts
+
+
+def rerank_characters_csv(characters_csv, counts, top=None):
+    """Merge fresh counts (and newcomers) into characters.csv and keep its top N
+
+    Returns (newcomers kept, rows dropped).
+    """
+    with open(characters_csv, newline="", encoding="utf-8") as infile:
+        previous = {row["name"]: parse_int(row.get("post_count")) or 0 for row in csv.DictReader(infile)}
+    top = top or len(previous)
+
+    merged = {**previous, **counts}
+    ranked = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:top]
+    write_csv_atomically(characters_csv, ["name", "post_count"], ranked)
+    kept = {name for name, _ in ranked}
+    return len(kept - previous.keys()), len(previous.keys() - kept)
+
+
+async def run(db_path=DEFAULT_DB_PATH, characters_csv=DEFAULT_CHARACTERS_CSV, top=None, margin=DEFAULT_MARGIN,
+              concurrency=DEFAULT_CONCURRENCY, pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None, rerank_csv=False):
+    """Sync post counts for the characters in db_path from tags.json (and with rerank_csv, rerank characters_csv)"""
+    started = time.perf_counter()
+    conn = connect(db_path)
+    try:
+        state = read_state(conn)
+        loaded, lowest = conn.execute(f"SELECT COUNT(*), MIN(post_count) FROM {TABLE}").fetchone()
+        if not loaded:
+            print(f"No characters in {db_path}; load them with load_db.py first")
+            return None
+        if state.get("synced_at"):
+            print(f"Last sync: {time.strftime('%Y-%m-%d %H:%M', time.localtime(float(state['synced_at'])))} "
+                  f"(watermark {state.get('watermark')}, {state.get('changed')} counts changed)")
+
+        watermark = max(1, int(lowest * (1 - margin)))
+        # Newcomers push tags down the list, so allow a page more than the loaded count
+        max_tags = int(loaded * (1 + margin)) + PAGE_SIZE
+        async with E621Client(concurrency=concurrency, cache=ResponseCache(), bypass_cache=True) as client:
+            counts = await fetch_counts(client, watermark, max_tags)
+            requests = len(client.metrics.timings.get("request.total", []))
+            client.metrics.report("Sync")
+
+        changed, pair_counts = apply_counts(conn, counts, {"synced_at": time.time(), "watermark": watermark,
+                                                           "tags_seen": len(counts), "requests": requests},
+                                            pairs_per_bucket, seed)
+        names = {name for (name,) in conn.execute(f"SELECT name FROM {TABLE}")}
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+    unseen = len(names - counts.keys())
+    newcomers = len(counts.keys() - names)
+    print(f"Read {len(counts)} tags down to post_count {watermark} in {requests} requests; "
+          f"updated {len(changed)} of {loaded} characters in {time.perf_counter() - started:.2f}s")
+    if pair_counts is not None:
+        print("Round pairs: " + ", ".join(f"{name}={pair_counts[name]}" for name, _, _ in DIFFICULTIES))
+    if unseen:
+        print(f"{unseen} characters fell below the watermark and kept their old count; "
+              f"a full get_chars.py crawl refreshes them")
+
+    if rerank_csv and characters_csv and os.path.exists(characters_csv):
+        newcomers, dropped = rerank_characters_csv(characters_csv, counts, top)
+        print(f"Reranked {characters_csv}: {newcomers} new characters, {dropped} dropped below the top")
+        if newcomers:
+            print("Run get_char_top_img.py --incremental and load_db.py to add them to the game")
+    elif newcomers:
+        print(f"{newcomers} tags above the watermark aren't in the game; "
+              f"--rerank-csv merges them into {characters_csv or 'characters.csv'}")
+    return changed
+
+
+def main(db_path=DEFAULT_DB_PATH, characters_csv=DEFAULT_CHARACTERS_CSV, top=None, margin=DEFAULT_MARGIN,
+         concurrency=DEFAULT_CONCURRENCY, pairs_per_bucket=DEFAULT_PAIRS_PER_BUCKET, seed=None, rerank_csv=False):
+    return asyncio.run(run(db_path, characters_csv, top, margin, concurrency, pairs_per_bucket, seed, rerank_csv))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the game's post counts from e621 with a handful of requests")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database to update (default: <repo>/database.sqlite)")
+    parser.add_argument("--characters", default=DEFAULT_CHARACTERS_CSV,
+                        help="characters.csv to rerank with --rerank-csv (default: scripts/characters.csv)")
+    parser.add_argument("--rerank-csv", action="store_true",
+                        help="Also merge the fresh counts and newcomers into --characters and re-sort it")
+    parser.add_argument("--top", type=int, help="Characters to keep in --characters (default: as many as it has)")
+    parser.add_argument("--margin", type=float, default=DEFAULT_MARGIN,
+                        help=f"How far below the lowest loaded count to keep reading (default: {DEFAULT_MARGIN})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Pages in flight at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--pairs", type=int, default=DEFAULT_PAIRS_PER_BUCKET,
+                        help=f"Round pairs per difficulty (default: {DEFAULT_PAIRS_PER_BUCKET})")
+    parser.add_argument("--seed", type=int, help="Random seed for the difficulty pools")
+    args = parser.parse_args()
+
+    main(args.db, args.characters, args.top, args.margin, args.concurrency, args.pairs, args.seed, args.rerank_csv)
@@ -0,0 +1,105 @@
+import json
+import os
+
+from checkpoint import CheckpointJournal, needs_refresh, parse_int, seed_from_csv
+
+NOW = 1_000_000_000
+DAY = 86400
+
+
+def test_parse_int_turns_blanks_and_junk_into_none():
+    assert parse_int("42") == 42
+    assert parse_int(7) == 7
+    assert parse_int("") is None
+    assert parse_int(None) is None
+    assert parse_int("1.5") is None
+
+
+def fresh(post_count=1000, **extra):
+    return {"name": "a", "image_url": "https://x/a.png", "post_count": post_count, "fetched_at": NOW - DAY, **extra}
+
+
+def test_needs_refresh_without_a_usable_record():
+    assert needs_refresh({"post_count": "1000"}, None, now=NOW)
+    assert needs_refresh({"post_count": "1000"}, fresh(image_url=""), now=NOW)
+
+
+def test_needs_refresh_after_max_age():
+    assert not needs_refresh({"post_count": "1000"}, fresh(), max_age_days=30, now=NOW)
+    assert needs_refresh({"post_count": "1000"}, fresh(fetched_at=NOW - 31 * DAY), max_age_days=30, now=NOW)
+    # Records without a fetch time are as old as can be
+    assert needs_refresh({"post_count": "1000"}, {"image_url": "https://x/a.png"}, now=NOW)
+
+
+def test_needs_refresh_when_post_count_moved_past_the_threshold():
+    assert not needs_refresh({"post_count": "1100"}, fresh(), count_change=0.10, now=NOW)
+    assert needs_refresh({"post_count": "1101"}, fresh(), count_change=0.10, now=NOW)
+    assert needs_refresh({"post_count": "899"}, fresh(), count_change=0.10, now=NOW)
+
+
+def test_needs_refresh_ignores_counts_it_cannot_compare():
+    assert not needs_refresh({"post_count": ""}, fresh(), now=NOW)
+    assert not needs_refresh({"post_count": "5000"}, fresh(post_count=None), now=NOW)
+    assert not needs_refresh({"post_count": "5000"}, fresh(post_count=0), now=NOW)
+
+
+def test_journal_replays_to_the_latest_record_per_tag(tmp_path):
+    journal = CheckpointJournal(str(tmp_path / "out.csv.journal"))
+    assert journal.load() == {}
+
+    journal.open()
+    journal.append("a", "https://x/1.png", 10, fetched_at=1)
+    journal.append("b", "https://x/2.png", 20, fetched_at=2, sync=False, image_width=850)
+    journal.append("a", "https://x/3.png", 11, fetched_at=3)
+    journal.close()
+
+    records = journal.load()
+    assert records["a"]["image_url"] == "https://x/3.png"
+    assert records["b"] == {"name": "b", "image_url": "https://x/2.png", "post_count": 20, "fetched_at": 2,
+                            "image_width": 850}
+    assert [record["name"] for record in journal.iter_records()] == ["a", "b", "a"]
+
+
+def test_journal_skips_a_line_truncated_by_a_crash(tmp_path):
+    path = str(tmp_path / "out.csv.journal")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"name": "a", "image_url": "https://x/1.png"}) + "\n")
+        f.write('{"name": "b", "image_u')
+
+    assert list(CheckpointJournal(path).load()) == ["a"]
+
+
+def test_journal_compaction_keeps_one_line_per_tag_and_resumes(tmp_path):
+    path = str(tmp_path / "out.csv.journal")
+    journal = CheckpointJournal(path).open()
+    for fetched_at in range(3):
+        journal.append("a", f"https://x/{fetched_at}.png", fetched_at=fetched_at)
+    journal.append("b", "https://x/b.png", fetched_at=5)
+
+    # compact() closes the file itself, so it is safe mid-run
+    journal.compact(journal.load())
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert not os.path.exists(path + ".tmp")
+
+    journal.open()
+    journal.append("c", "https://x/c.png", fetched_at=6)
+    journal.close()
+    records = journal.load()
+    assert {name: record["image_url"] for name, record in records.items()} == {
+        "a": "https://x/2.png", "b": "https://x/b.png", "c": "https://x/c.png"}
+
+    journal.open(truncate=True).close()
+    assert journal.load() == {}
+
+
+def test_seed_from_csv_builds_records_without_post_counts(tmp_path):
+    path = str(tmp_path / "out.csv")
+    assert seed_from_csv(path) == {}
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("name,image_url,image_width,image_height\na,https://x/a.png,850,\n")
+
+    records = seed_from_csv(path)
+    assert records["a"]["post_count"] is None
+    assert (records["a"]["image_width"], records["a"]["image_height"]) == (850, None)
+    assert records["a"]["fetched_at"] == os.path.getmtime(path)
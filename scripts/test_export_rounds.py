@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+
+from export_rounds import ANY_POOL, daily_rounds, pick_rounds
+
+np = pytest.importorskip("numpy")
+
+DAY = datetime.date(2026, 10, 17)
+
+
+def any_pool(count):
+    """round_pool for `count` characters with ids 1..count and distinct post counts"""
+    return np.arange(1, count + 1), np.arange(count), np.ones(count, dtype=np.int64)
+
+
+def test_pick_rounds_prefers_new_characters_then_allows_repeats():
+    seen, played = set(), set()
+    assert pick_rounds([[1, 2], [2, 3], [4, 5]], 2, seen, played) == [[1, 2], [4, 5]]
+    assert pick_rounds([[1, 2], [2, 1], [2, 3]], 5, seen, played) == [[2, 3]]
+    assert seen == {1, 2, 3, 4, 5}
+
+
+def test_daily_rounds_never_repeats_a_round_in_small_pools():
+    pools = {"easy": np.array([[1, 3], [3, 4], [7, 9]]), "medium": np.array([[5, 6]]),
+             "hard": np.array([[7, 8], [2, 9]])}
+
+    pairs, difficulties = daily_rounds(pools, any_pool(10), 10, 0, DAY)
+
+    assert len(pairs) == len(difficulties) == 10
+    assert len({frozenset(pair) for pair in pairs}) == 10
+    # The ramp holds: each difficulty's pairs come first in its third, topped up with random rounds
+    assert difficulties[:3] == ["easy"] * 3
+    assert difficulties.count("medium") == 1 and difficulties.count("hard") == 2
+    assert difficulties.count(ANY_POOL) == 4
+
+
+def test_daily_rounds_without_pair_pools_uses_random_rounds():
+    empty = np.empty((0, 2), dtype=np.int64)
+
+    pairs, difficulties = daily_rounds({"easy": empty, "medium": empty, "hard": empty}, any_pool(200), 50, 0, DAY)
+
+    assert len(pairs) == 50
+    assert set(difficulties) == {ANY_POOL}
+    # 200 characters are plenty for 50 rounds without repeating anyone
+    assert len({character for pair in pairs for character in pair}) == 100
+
+
+def test_daily_rounds_are_the_same_for_everyone_on_a_day():
+    pools = {"easy": np.array([[1, 50], [2, 60]]), "medium": np.array([[3, 9]]), "hard": np.array([[4, 5]])}
+
+    first = daily_rounds(pools, any_pool(100), 12, 7, DAY)
+    assert daily_rounds(pools, any_pool(100), 12, 7, DAY) == first
+    assert daily_rounds(pools, any_pool(100), 12, 7, DAY + datetime.timedelta(days=1)) != first
@@ -0,0 +1,127 @@
+import csv
+
+from image_selection import (CANDIDATE_FIELDS, CandidateIndex, exclusive_candidates, md5_from_url, read_candidates,
+                             resolve_duplicates)
+
+
+def url(md5, sample=False):
+    return f"https://static1.e621.net/data/{'sample/' if sample else ''}{md5[:2]}/{md5[2:4]}/{md5}.png"
+
+
+A, B, C, D = (letter * 32 for letter in "abcd")
+
+
+def record(name, image, post_count, *candidates):
+    return {"name": name, "image_url": url(image) if image else "", "post_count": post_count,
+            "candidates": [{"url": url(md5)} for md5 in candidates]}
+
+
+def test_md5_from_url_gives_both_renditions_one_key():
+    assert md5_from_url(url(A)) == (A, "png")
+    assert md5_from_url(url(A, sample=True)) == (A, "png")
+    assert md5_from_url("https://example.com/image.png") == (None, None)
+    assert md5_from_url(None) == (None, None)
+
+
+def test_resolve_duplicates_leaves_the_image_with_the_highest_post_count():
+    records = [record("small", A, 10, A, B), record("big", A, 100, A, C)]
+
+    replacements, shared, taken = resolve_duplicates(lambda: iter(records))
+
+    assert replacements == {"small": {"url": url(B)}}
+    assert shared == []
+    assert taken == {A: "big", B: "small"}
+
+
+def test_resolve_duplicates_keeps_the_first_character_on_a_post_count_tie():
+    records = [record("first", A, 50, A, B), record("second", A, 50, A, C)]
+
+    replacements, _, taken = resolve_duplicates(lambda: iter(records))
+
+    assert replacements == {"second": {"url": url(C)}}
+    assert taken[A] == "first"
+
+
+def test_resolve_duplicates_matches_samples_to_their_original():
+    records = [record("big", A, 100), {"name": "small", "image_url": url(A, sample=True), "post_count": 1,
+                                       "candidates": [{"url": url(B)}]}]
+
+    replacements, _, _ = resolve_duplicates(lambda: iter(records))
+
+    assert replacements == {"small": {"url": url(B)}}
+
+
+def test_resolve_duplicates_never_takes_an_image_someone_already_shows():
+    # B is "small"'s next candidate, but "other" already shows it
+    records = [record("big", A, 100), record("small", A, 10, A, B, C), record("other", B, 1)]
+
+    replacements, shared, taken = resolve_duplicates(lambda: iter(records))
+
+    assert replacements == {"small": {"url": url(C)}}
+    assert taken[B] == "other"
+
+
+def test_resolve_duplicates_gives_contested_candidates_to_higher_counts_first():
+    records = [record("top", A, 100), record("low", A, 5, A, B), record("mid", A, 50, A, B)]
+
+    replacements, shared, _ = resolve_duplicates(lambda: iter(records))
+
+    assert replacements == {"mid": {"url": url(B)}}
+    assert shared == ["low"]
+
+
+def test_resolve_duplicates_leaves_losers_without_an_unused_candidate_sharing():
+    records = [record("big", A, 100), record("small", A, 10, A), record("none", A, 1)]
+
+    replacements, shared, taken = resolve_duplicates(lambda: iter(records))
+
+    assert replacements == {}
+    assert shared == ["small", "none"]
+    assert taken == {A: "big"}
+
+
+def test_resolve_duplicates_ignores_rows_without_an_image():
+    records = [record("missing", None, 100, A), record("big", A, 10)]
+
+    assert resolve_duplicates(lambda: iter(records)) == ({}, [], {A: "big"})
+
+
+def test_exclusive_candidates_drops_other_characters_images():
+    candidates = [{"url": url(md5)} for md5 in (A, B, C)] + [{"url": "https://example.com/x.png"}]
+    taken = {A: "me", B: "someone else"}
+
+    kept = exclusive_candidates("me", candidates, taken)
+
+    assert [candidate["url"] for candidate in kept] == [url(A), url(C), "https://example.com/x.png"]
+
+
+def write_candidates_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CANDIDATE_FIELDS)
+        writer.writerows(rows)
+
+
+def test_candidate_index_matches_read_candidates(tmp_path):
+    path = str(tmp_path / "top_img_candidates.csv")
+    write_candidates_csv(path, [
+        ["b", 1, 12, url(C), 30, "", 850, 600],
+        ["a", 0, 10, url(A), 50, 1000, 850, 600],
+        ["b", 0, 11, url(B), 40, 2000, "", ""],
+        ["a", 1, 13, url(D), "junk", 3000, 850, 600],
+    ])
+
+    expected = read_candidates(path)
+    with CandidateIndex(path) as index:
+        assert len(index) == 2
+        assert index.get("a") == expected["a"]
+        assert index.get("b") == expected["b"]
+        assert index.get("c", []) == []
+    assert [candidate["post_id"] for candidate in expected["b"]] == [11, 12]
+    assert expected["a"][1]["score"] is None
+
+
+def test_candidate_index_without_a_file_is_empty(tmp_path):
+    with CandidateIndex(str(tmp_path / "missing.csv")) as index:
+        assert len(index) == 0
+        assert index.get("a") is None
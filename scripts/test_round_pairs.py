@@ -0,0 +1,85 @@
+import math
+import sqlite3
+
+import pytest
+
+import round_pairs
+from round_pairs import DIFFICULTIES, build_pair_pools, sample_pairs
+
+np = pytest.importorskip("numpy")
+
+
+def difficulty(counts, pair):
+    a, b = (counts[index] for index in pair)
+    ratio = max(a, b) / min(a, b)
+    return next(name for name, low, high in DIFFICULTIES if low <= ratio < high)
+
+
+@pytest.mark.parametrize("counts", [[], [100]])
+def test_sample_pairs_needs_two_characters(counts):
+    buckets = sample_pairs(counts, 10, seed=1)
+    assert {name: len(pairs) for name, pairs in buckets.items()} == {"hard": 0, "medium": 0, "easy": 0}
+
+
+def test_sample_pairs_with_two_characters_finds_their_one_pair():
+    buckets = sample_pairs([100, 1000], 10, seed=1)
+    assert len(buckets["hard"]) == len(buckets["medium"]) == 0
+    assert sorted(buckets["easy"][0].tolist()) == [0, 1]
+    assert len(buckets["easy"]) == 1
+
+
+def test_sample_pairs_skips_equal_post_counts():
+    buckets = sample_pairs([500, 500, 500], 10, seed=1)
+    assert all(len(pairs) == 0 for pairs in buckets.values())
+
+
+def test_sample_pairs_buckets_distinct_pairs_by_ratio():
+    counts = [int(200000 / (1 + i) ** 0.9) for i in range(300)]
+    buckets = sample_pairs(counts, 200, seed=7)
+
+    for name, pairs in buckets.items():
+        assert 0 < len(pairs) <= 200
+        assert len({tuple(sorted(pair)) for pair in pairs.tolist()}) == len(pairs)
+        for pair in pairs.tolist():
+            assert counts[pair[0]] != counts[pair[1]]
+            assert difficulty(counts, pair) == name
+
+
+def test_sample_pairs_randomizes_sides_and_is_reproducible():
+    counts = list(range(1, 201))
+    first = sample_pairs(counts, 100, seed=3)
+    second = sample_pairs(counts, 100, seed=3)
+
+    for name, pairs in first.items():
+        assert np.array_equal(pairs, second[name])
+    higher_first = [counts[a] > counts[b] for a, b in first["hard"].tolist()]
+    assert any(higher_first) and not all(higher_first)
+
+
+def test_sample_pairs_in_a_small_pool_stops_short_of_the_target():
+    buckets = sample_pairs([1, 2, 10], 50, seed=2)
+    total = sum(len(pairs) for pairs in buckets.values())
+    assert total == math.comb(3, 2)
+
+
+def test_build_pair_pools_without_numpy_leaves_the_table_empty(monkeypatch):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE characters (id INTEGER PRIMARY KEY, post_count INTEGER)")
+    conn.executemany("INSERT INTO characters VALUES (?, ?)", [(1, 100), (2, 1000)])
+    monkeypatch.setattr(round_pairs, "np", None)
+
+    assert build_pair_pools(conn, "characters", "pairs") == {"hard": 0, "medium": 0, "easy": 0}
+    assert conn.execute("SELECT COUNT(*) FROM pairs").fetchone() == (0,)
+
+
+def test_build_pair_pools_stores_character_ids():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE characters (id INTEGER PRIMARY KEY, post_count INTEGER)")
+    conn.executemany("INSERT INTO characters VALUES (?, ?)", [(10, 100), (20, 120), (30, 1000)])
+
+    sizes = build_pair_pools(conn, "characters", "pairs", 5, seed=1)
+
+    rows = conn.execute("SELECT difficulty, slot, character_a, character_b FROM pairs").fetchall()
+    assert sizes == {"hard": 1, "medium": 0, "easy": 2}
+    assert {(name, frozenset((a, b))) for name, _, a, b in rows} == {
+        ("hard", frozenset((10, 20))), ("easy", frozenset((10, 30))), ("easy", frozenset((20, 30)))}
@@ -0,0 +1,262 @@
+"""Check that the image URLs in top_img.csv still resolve.
+
+Every stored URL gets a pooled HEAD request (falling back to a one-byte
+ranged GET when the server won't answer HEAD or omits Content-Length). The
+status, content type and byte size go to a report CSV, and each URL gets a
+verdict: ok, dead, oversized, not_image or missing.
+
+When get_char_top_img.py left a <input>_candidates.csv next to the input,
+a bad URL's runners-up are checked in rank order and the first good one is
+promoted in place, without asking e621 again. Bad entries with nothing to
+promote can be blanked in a copy of the input so fix_missing_images.py
+re-fetches them.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import time
+from collections import Counter
+
+import aiohttp
+
+from e621_client import USER_AGENT
+from image_selection import CandidateIndex, candidates_path_for
+from rate_limiter import TokenBucket
+from row_writer import RowWriter
+from streaming import TaskPool, count_rows, in_flight_limit, read_fieldnames, read_rows
+
+DEFAULT_CONCURRENCY = 20
+DEFAULT_REQUESTS_PER_SECOND = 10.0  # static1.e621.net is a CDN, but stay polite
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+REQUEST_TIMEOUT = 15
+
+REPORT_FIELDS = ["name", "image_url", "status", "content_type", "size", "verdict", "promoted_url", "checked_at"]
+REFETCH_VERDICTS = {"dead", "oversized", "not_image"}
+
+
+def parse_size(response):
+    """Total size from Content-Range ("bytes 0-0/12345") or Content-Length"""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    if response.status != 206 and response.content_length is not None:
+        return response.content_length
+    return None
+
+
+def verdict_for(status, content_type, size, max_bytes):
+    if status is None or status >= 400:
+        return "dead"
+    if content_type and not content_type.startswith("image/"):
+        return "not_image"
+    if max_bytes and size is not None and size > max_bytes:
+        return "oversized"
+    return "ok"
+
+
+async def check_url(session, url, bucket=None, max_bytes=DEFAULT_MAX_BYTES):
+    """Return (status, content_type, size, verdict) for one image URL"""
+    if not url:
+        return None, "", None, "missing"
+
+    status = content_type = size = None
+    try:
+        if bucket is not None:
+            await bucket.acquire()
+        async with session.head(url, allow_redirects=True) as response:
+            status = response.status
+            content_type = response.content_type
+            size = parse_size(response)
+
+        if status in (403, 405, 501) or (status < 400 and size is None):
+            # Some servers refuse HEAD or leave out the length; ask for one byte instead
+            if bucket is not None:
+                await bucket.acquire()
+            async with session.get(url, headers={"Range": "bytes=0-0"}, allow_redirects=True) as response:
+                status = response.status
+                content_type = response.content_type
+                size = parse_size(response)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        status = None
+
+    return status, content_type or "", size, verdict_for(status, content_type, size, max_bytes)
+
+
+async def promote_candidate(session, url, candidates, bucket=None, max_bytes=DEFAULT_MAX_BYTES):
+    """Return the first candidate record after `url` whose image checks out, or None"""
+    for candidate in candidates:
+        if not candidate["url"] or candidate["url"] == url:
+            continue
+        *_, verdict = await check_url(session, candidate["url"], bucket, max_bytes)
+        if verdict == "ok":
+            return candidate
+    return None
+
+
+class Validator:
+    """One pooled session, rate limit and candidate list for checking rows; use as an async context manager
+
+    `candidates` ({name: [candidate record, ...]} or a CandidateIndex, see
+    image_selection.py) enables promotion: a bad or missing URL's result then carries the first
+    working runner-up as "promoted" (None if there was none).
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                 max_bytes=DEFAULT_MAX_BYTES, candidates=None):
+        self.concurrency = concurrency
+        self.max_bytes = max_bytes
+        self.candidates = candidates or {}
+        self._bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT},
+                                              timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+
+    async def check(self, row):
+        """Check one row's image_url; returns its report fields plus the promoted candidate"""
+        url = (row.get("image_url") or "").strip()
+        async with self._semaphore:
+            status, content_type, size, verdict = await check_url(self._session, url, self._bucket, self.max_bytes)
+            promoted = None
+            if verdict in REFETCH_VERDICTS or verdict == "missing":
+                promoted = await promote_candidate(self._session, url, self.candidates.get(row["name"], []),
+                                                   self._bucket, self.max_bytes)
+        return {
+            "name": row["name"],
+            "image_url": url,
+            "status": status if status is not None else "",
+            "content_type": content_type,
+            "size": size if size is not None else "",
+            "verdict": verdict,
+            "promoted": promoted,
+            "promoted_url": promoted["url"] if promoted else "",
+            "checked_at": int(time.time()),
+        }
+
+
+async def validate_rows(rows, report_file=None, concurrency=DEFAULT_CONCURRENCY,
+                        requests_per_second=DEFAULT_REQUESTS_PER_SECOND, max_bytes=DEFAULT_MAX_BYTES,
+                        candidates=None, total=None, fixed_file=None, fieldnames=None):
+    """Validate the image_url of every row (see Validator); returns the tallies from tally()
+
+    `rows` may be any iterable; only a bounded number of checks are in flight
+    (see streaming.py). The report, and with fixed_file the fixed_row() of
+    every row, are written in input order.
+    """
+    stats = {"verdicts": Counter(), "refetch": 0}
+    fixed_writer = RowWriter(fixed_file, ordered=True, label="fixed rows") if fixed_file is not None else None
+
+    async def check(index, row):
+        result = await validator.check(row)
+        tally(stats, result)
+        await writer.put(index, [result[field] for field in REPORT_FIELDS])
+        if fixed_writer is not None:
+            fixed = fixed_row(row, result, fieldnames)
+            await fixed_writer.put(index, [fixed.get(field, "") for field in fieldnames])
+
+    async with Validator(concurrency, requests_per_second, max_bytes, candidates) as validator, \
+            RowWriter(report_file, total=total, ordered=True, label="urls") as writer, \
+            (fixed_writer or contextlib.nullcontext()), \
+            TaskPool(in_flight_limit(concurrency)) as pool:
+        for index, row in enumerate(rows):
+            await pool.submit(check(index, row))
+
+    return stats
+
+
+def tally(stats, result):
+    """Count one result into validate_rows()'s stats"""
+    stats["verdicts"][result["verdict"]] += 1
+    if result.get("promoted"):
+        stats["verdicts"]["promoted"] += 1
+    elif result["verdict"] in REFETCH_VERDICTS:
+        stats["refetch"] += 1
+
+
+def fixed_row(row, result, fieldnames=None):
+    """The row with a promoted candidate swapped in, or with a bad URL blanked for re-fetching
+
+    Only columns in `fieldnames` (default: the row's own plus image_url) are
+    set; others pass through, and a stale local_image is cleared either way.
+    """
+    promoted = result.get("promoted")
+    if promoted is not None:
+        image = {"image_url": promoted["url"], "image_width": promoted.get("width"),
+                 "image_height": promoted.get("height")}
+    elif result["verdict"] in REFETCH_VERDICTS:
+        image = {"image_url": "", "image_width": "", "image_height": ""}
+    else:
+        return row
+    fieldnames = fieldnames or list(row) + ["image_url"]
+    fields = {field: "" if value is None else value for field, value in image.items() if field in fieldnames}
+    if row.get("local_image"):
+        fields["local_image"] = ""
+    return {**row, **fields}
+
+
+async def run(input_csv, report_csv, fixed_csv=None, concurrency=DEFAULT_CONCURRENCY,
+              requests_per_second=DEFAULT_REQUESTS_PER_SECOND, max_bytes=DEFAULT_MAX_BYTES, candidates_csv=None):
+    """Validate every URL in input_csv, write a report and optionally a fixed copy
+
+    The copy has bad URLs replaced by a working candidate from candidates_csv
+    (default: <input>_candidates.csv, if present) or blanked.
+    """
+    total = count_rows(input_csv)
+    fieldnames = read_fieldnames(input_csv)
+    if "image_url" not in fieldnames:
+        fieldnames = fieldnames + ["image_url"]
+
+    with CandidateIndex(candidates_csv or candidates_path_for(input_csv)) as candidates, \
+            open(report_csv, "w", newline="", encoding="utf-8") as report_file, \
+            (open(fixed_csv, "w", newline="", encoding="utf-8") if fixed_csv else contextlib.nullcontext()) as fixed_file:
+        print(f"Validating {total} image URLs with {concurrency} concurrent requests "
+              f"({len(candidates)} characters have fallback candidates)...")
+        csv.writer(report_file).writerow(REPORT_FIELDS)
+        if fixed_file is not None:
+            csv.writer(fixed_file).writerow(fieldnames)
+        stats = await validate_rows(read_rows(input_csv), report_file, concurrency, requests_per_second, max_bytes,
+                                    candidates, total, fixed_file, fieldnames)
+
+    counts = stats["verdicts"]
+    print("Verdicts: " + ", ".join(f"{verdict}={count}" for verdict, count in sorted(counts.items())))
+    print(f"Report written to: {report_csv}")
+    if fixed_csv:
+        print(f"Promoted {counts.get('promoted', 0)} fallback candidates and marked {stats['refetch']} URLs "
+              f"for re-fetch in: {fixed_csv}")
+    return stats
+
+
+def main(input_csv, report_csv, fixed_csv=None, concurrency=DEFAULT_CONCURRENCY,
+         requests_per_second=DEFAULT_REQUESTS_PER_SECOND, max_bytes=DEFAULT_MAX_BYTES, candidates_csv=None):
+    return asyncio.run(run(input_csv, report_csv, fixed_csv, concurrency, requests_per_second, max_bytes,
+                           candidates_csv))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that stored image URLs still resolve")
+    parser.add_argument("input_csv", help="CSV with name and image_url columns (e.g. top_img.csv)")
+    parser.add_argument("report_csv", help="Where to write the per-URL report")
+    parser.add_argument("--fixed-output",
+                        help="Also write a copy of input_csv with dead/oversized URLs replaced by a candidate or blanked")
+    parser.add_argument("--candidates", help="Ranked fallback images (default: <input>_candidates.csv if it exists)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Requests in flight at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--rps", type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help=f"Requests per second budget (default: {DEFAULT_REQUESTS_PER_SECOND})")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES,
+                        help=f"Images larger than this are marked oversized (default: {DEFAULT_MAX_BYTES})")
+    args = parser.parse_args()
+
+    main(args.input_csv, args.report_csv, args.fixed_output, args.concurrency, args.rps, args.max_bytes, args.candidates)
@@ -12,6 +12,25 @@ app.use(cors());
 app.use(express.json());
 app.use(express.static('dist'));
 
+// Locally stored image derivatives (scripts/image_store.py) are content-addressed,
+// so they never change under the same URL and can be cached forever
+app.use('/images', express.static(path.join(__dirname, 'images'), {
+  maxAge: '365d',
+  immutable: true,
+}));
+
+// Pre-generated round sequences (scripts/export_rounds.py): shard names carry
+// a content hash and never change, the manifest listing them does
+app.use('/rounds', express.static(path.join(__dirname, 'rounds'), {
+  maxAge: '365d',
+  immutable: true,
+  setHeaders: (res, filePath) => {
+    if (path.basename(filePath) === 'manifest.json') {
+      res.setHeader('Cache-Control', 'no-cache');
+    }
+  },
+}));
+
 // Database setup
 const dbPath = path.join(__dirname, 'database.sqlite');
 const db = new sqlite3.Database(dbPath);
@@ -23,9 +42,18 @@ db.serialize(() => {
       id INTEGER PRIMARY KEY AUTOINCREMENT,
       name VARCHAR(255) NOT NULL,
       post_count INTEGER NOT NULL,
-      image_url TEXT
+      image_url TEXT,
+      local_image TEXT,
+      image_width INTEGER,
+      image_height INTEGER
     )
   `);
+
+  // Databases seeded before local images and stored dimensions existed lack
+  // these columns; the error for an already existing column is expected and ignored
+  db.run('ALTER TABLE characters ADD COLUMN local_image TEXT', () => {});
+  db.run('ALTER TABLE characters ADD COLUMN image_width INTEGER', () => {});
+  db.run('ALTER TABLE characters ADD COLUMN image_height INTEGER', () => {});
   
   // Create index on post_count for better performance
   db.run(`CREATE INDEX IF NOT EXISTS idx_post_count ON characters(post_count)`);
@@ -33,51 +61,147 @@ db.serialize(() => {
 
 // API Routes
 
+const CHARACTER_COLUMNS = 'c.id, c.name, c.post_count, c.image_url, c.local_image, c.image_width, c.image_height';
+
+// round_pool (built by scripts/load_db.py) lists every character in post_count
+// order; group_start/group_size give the slots that share its post_count
+const poolSlotQuery = `
+  SELECT ${CHARACTER_COLUMNS}, p.group_start, p.group_size
+  FROM round_pool p
+  JOIN characters c ON c.id = p.character_id
+  WHERE p.slot = ?
+`;
+
+// round_pairs (scripts/round_pairs.py) holds pre-sampled pairs per difficulty
+const DIFFICULTIES = ['easy', 'medium', 'hard'];
+const pairSlotQuery = `
+  SELECT ${CHARACTER_COLUMNS}
+  FROM round_pairs r
+  JOIN characters c ON c.id IN (r.character_a, r.character_b)
+  WHERE r.difficulty = ? AND r.slot = ?
+  ORDER BY c.id = r.character_b
+`;
+
+// image_candidates (scripts/load_db.py) holds each character's ranked
+// runner-up images, so the frontend can swap in another one without a re-query
+const fallbackImagesQuery = `
+  SELECT i.character_id, i.url
+  FROM image_candidates i
+  JOIN characters c ON c.id = i.character_id
+  WHERE i.character_id IN (?, ?) AND i.url IS NOT c.image_url
+  ORDER BY i.character_id, i.rank
+`;
+
+function withoutGroup({ group_start, group_size, ...character }) {
+  return character;
+}
+
 /**
- * GET /api/get-round
- * Returns two random characters with different post counts
+ * Respond with a round, each character carrying its fallback_images.
+ * Databases loaded before image_candidates existed get empty lists.
  */
-app.get('/api/get-round', (req, res) => {
-  // More robust query to ensure different post counts
-  const query = `
-    WITH RandomPair AS (
-      SELECT c1.id as id1, c1.name as name1, c1.post_count as count1, c1.image_url as img1,
-             c2.id as id2, c2.name as name2, c2.post_count as count2, c2.image_url as img2
-      FROM characters c1
-      JOIN characters c2 ON c1.post_count != c2.post_count AND c1.id != c2.id
-      ORDER BY RANDOM()
-      LIMIT 1
-    )
-    SELECT id1 as id, name1 as name, count1 as post_count, img1 as image_url FROM RandomPair
-    UNION ALL
-    SELECT id2 as id, name2 as name, count2 as post_count, img2 as image_url FROM RandomPair
+function sendRound(res, characters) {
+  db.all(fallbackImagesQuery, characters.map(c => c.id), (err, rows) => {
+    const fallbacks = {};
+    for (const row of err ? [] : rows) {
+      (fallbacks[row.character_id] = fallbacks[row.character_id] || []).push(row.url);
+    }
+    res.json(characters.map(c => ({ ...c, fallback_images: fallbacks[c.id] || [] })));
+  });
+}
+
+/**
+ * Fallback for databases loaded before round_pool existed: any two random
+ * characters, without the different-post_count guarantee
+ */
+function sendRandomCharacters(res) {
+  const fallbackQuery = `
+    SELECT ${CHARACTER_COLUMNS}
+    FROM characters c
+    ORDER BY RANDOM()
+    LIMIT 2
   `;
-  
-  db.all(query, (err, rows) => {
-    if (err) {
-      console.error('Database error:', err);
-      return res.status(500).json({ error: 'Database error' });
+
+  db.all(fallbackQuery, (err, rows) => {
+    if (err || rows.length < 2) {
+      return res.status(500).json({ error: 'Not enough characters in database' });
     }
-    
-    if (rows.length < 2) {
-      // Fallback to simple random selection if complex query fails
-      const fallbackQuery = `
-        SELECT id, name, post_count, image_url
-        FROM characters 
-        ORDER BY RANDOM() 
-        LIMIT 2
-      `;
-      
-      db.all(fallbackQuery, (err2, fallbackRows) => {
-        if (err2 || fallbackRows.length < 2) {
-          return res.status(500).json({ error: 'Not enough characters in database' });
+    sendRound(res, rows);
+  });
+}
+
+/**
+ * Send two random characters with different post counts: two primary-key
+ * lookups into the precomputed pool, so the cost of a round doesn't grow
+ * with the number of characters
+ */
+function sendRandomRound(res) {
+  db.get('SELECT MAX(slot) + 1 AS size FROM round_pool', (err, pool) => {
+    if (err || !pool || !pool.size) {
+      return sendRandomCharacters(res);
+    }
+
+    db.get(poolSlotQuery, [Math.floor(Math.random() * pool.size)], (err1, first) => {
+      if (err1 || !first) {
+        console.error('Database error:', err1);
+        return res.status(500).json({ error: 'Database error' });
+      }
+
+      // Pick uniformly among the slots outside the first character's post_count group
+      const others = pool.size - first.group_size;
+      if (others <= 0) {
+        return res.status(500).json({ error: 'Not enough characters in database' });
+      }
+      let secondSlot = Math.floor(Math.random() * others);
+      if (secondSlot >= first.group_start) {
+        secondSlot += first.group_size;
+      }
+
+      db.get(poolSlotQuery, [secondSlot], (err2, second) => {
+        if (err2 || !second) {
+          console.error('Database error:', err2);
+          return res.status(500).json({ error: 'Database error' });
         }
-        res.json(fallbackRows);
+        sendRound(res, [withoutGroup(first), withoutGroup(second)]);
       });
-    } else {
-      res.json(rows);
+    });
+  });
+}
+
+/**
+ * Send one random pre-sampled pair of the given difficulty, or a plain
+ * random round if that pool hasn't been built
+ */
+function sendDifficultyRound(difficulty, res) {
+  db.get('SELECT MAX(slot) + 1 AS size FROM round_pairs WHERE difficulty = ?', [difficulty], (err, pool) => {
+    if (err || !pool || !pool.size) {
+      return sendRandomRound(res);
     }
+
+    db.all(pairSlotQuery, [difficulty, Math.floor(Math.random() * pool.size)], (err2, rows) => {
+      if (err2 || rows.length < 2) {
+        console.error('Database error:', err2);
+        return res.status(500).json({ error: 'Database error' });
+      }
+      sendRound(res, rows);
+    });
   });
+}
+
+/**
+ * GET /api/get-round[?difficulty=easy|medium|hard]
+ * Returns two random characters with different post counts, optionally
+ * drawn from one difficulty pool
+ */
+app.get('/api/get-round', (req, res) => {
+  const { difficulty } = req.query;
+  if (difficulty === undefined) {
+    return sendRandomRound(res);
+  }
+  if (!DIFFICULTIES.includes(difficulty)) {
+    return res.status(400).json({ error: `difficulty must be one of: ${DIFFICULTIES.join(', ')}` });
+  }
+  sendDifficultyRound(difficulty, res);
 });
 
 /**
@@ -39,6 +39,23 @@ describe('CharacterCard', () => {
     expect(image).toHaveAttribute('src', 'https://example.com/image.jpg');
   });
 
+  it('should prefer the locally served image when local_image is provided', () => {
+    const characterWithLocalImage = { ...mockCharacter, local_image: '/images/derived/ab/cd/abcd_800.webp' };
+    render(<CharacterCard {...defaultProps} character={characterWithLocalImage} />);
+    
+    const image = screen.getByAltText('test character name');
+    expect(image).toHaveAttribute('src', '/images/derived/ab/cd/abcd_800.webp');
+  });
+
+  it('should reserve the image dimensions when they are known', () => {
+    const characterWithSize = { ...mockCharacter, image_width: 850, image_height: 1200 };
+    render(<CharacterCard {...defaultProps} character={characterWithSize} />);
+    
+    const image = screen.getByAltText('test character name');
+    expect(image).toHaveAttribute('width', '850');
+    expect(image).toHaveAttribute('height', '1200');
+  });
+
   it('should render fallback text when image_url is null', () => {
     const characterWithoutImage = { ...mockCharacter, image_url: null };
     render(<CharacterCard {...defaultProps} character={characterWithoutImage} />);
@@ -105,6 +122,27 @@ describe('CharacterCard', () => {
     expect(screen.getByText('Image not available')).toBeInTheDocument();
   });
 
+  it('should try the fallback images in order before giving up', () => {
+    const characterWithFallbacks = {
+      ...mockCharacter,
+      image_width: 850,
+      image_height: 1200,
+      fallback_images: ['https://example.com/fallback1.jpg', 'https://example.com/fallback2.jpg'],
+    };
+    render(<CharacterCard {...defaultProps} character={characterWithFallbacks} />);
+    
+    const image = screen.getByAltText('test character name');
+    fireEvent.error(image);
+    expect(image).toHaveAttribute('src', 'https://example.com/fallback1.jpg');
+    expect(image).not.toHaveAttribute('width');
+    
+    fireEvent.error(image);
+    expect(image).toHaveAttribute('src', 'https://example.com/fallback2.jpg');
+    
+    fireEvent.error(image);
+    expect(screen.getByText('Image not available')).toBeInTheDocument();
+  });
+
   it('should apply correct styling when isCorrect is true', () => {
     const { container } = render(<CharacterCard {...defaultProps} isCorrect={true} />);
     
@@ -1,7 +1,7 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import styled from 'styled-components';
 import { CharacterCardProps } from './CharacterCard.types';
-import { formatCharacterName, formatPostCount } from '@/utils/gameLogic';
+import { formatCharacterName, formatPostCount, getImageSources } from '@/utils/gameLogic';
 
 const CardContainer = styled.div<{
   disabled: boolean;
@@ -87,6 +87,16 @@ export const CharacterCard: React.FC<CharacterCardProps> = ({
   isGrayedOut,
   disabled,
 }) => {
+  const imageSources = getImageSources(character);
+  const [sourceIndex, setSourceIndex] = useState(0);
+  const imageSrc = imageSources[sourceIndex] ?? null;
+  // Stored dimensions describe the primary image, not the fallbacks
+  const showsPrimaryImage = imageSrc === (character.local_image || character.image_url);
+
+  useEffect(() => {
+    setSourceIndex(0);
+  }, [character.id]);
+
   const handleClick = () => {
     if (!disabled && onClick) {
       onClick(character);
@@ -94,6 +104,10 @@ export const CharacterCard: React.FC<CharacterCardProps> = ({
   };
 
   const handleImageError = (e: React.SyntheticEvent<HTMLImageElement>) => {
+    if (sourceIndex + 1 < imageSources.length) {
+      setSourceIndex(sourceIndex + 1);
+      return;
+    }
     const target = e.target as HTMLImageElement;
     target.style.display = 'none';
     const parent = target.parentElement;
@@ -111,10 +125,12 @@ export const CharacterCard: React.FC<CharacterCardProps> = ({
       onClick={handleClick}
     >
       <CharacterImage>
-        {character.image_url ? (
+        {imageSrc ? (
           <img 
-            src={character.image_url} 
+            src={imageSrc} 
             alt={formatCharacterName(character.name)}
+            width={showsPrimaryImage ? character.image_width ?? undefined : undefined}
+            height={showsPrimaryImage ? character.image_height ?? undefined : undefined}
             onError={handleImageError}
           />
         ) : (
@@ -4,6 +4,11 @@ export interface Character {
   name: string;
   post_count: number;
   image_url: string | null;
+  local_image?: string | null;
+  image_width?: number | null;
+  image_height?: number | null;
+  // Ranked runner-up image URLs to try when image_url fails to load
+  fallback_images?: string[];
 }
 
 // CharacterCard component props
@@ -4,6 +4,9 @@ export interface Character {
   name: string;
   post_count: number;
   image_url: string | null;
+  local_image?: string | null;
+  image_width?: number | null;
+  image_height?: number | null;
 }
 
 // CharacterCard component props
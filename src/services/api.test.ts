@@ -38,6 +38,17 @@ describe('ApiService', () => {
       expect(mockFetch).toHaveBeenCalledWith('/api/get-round');
     });
 
+    it('should request a difficulty pool when a difficulty is given', async () => {
+      mockFetch.mockResolvedValueOnce({
+        ok: true,
+        json: async () => [],
+      } as Response);
+
+      await apiService.getRound('hard');
+
+      expect(mockFetch).toHaveBeenCalledWith('/api/get-round?difficulty=hard');
+    });
+
     it('should return error when API call fails', async () => {
       mockFetch.mockResolvedValueOnce({
         ok: false,
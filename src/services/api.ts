@@ -1,4 +1,4 @@
-import { GetRoundResponse, ApiResponse } from '../shared/types';
+import { GetRoundResponse, ApiResponse, Difficulty } from '../shared/types';
 
 const API_BASE_URL = '/api';
 
@@ -21,8 +21,9 @@ class ApiService {
     }
   }
 
-  async getRound(): Promise<ApiResponse<GetRoundResponse>> {
-    const result = await this.request<GetRoundResponse>('/get-round');
+  async getRound(difficulty?: Difficulty): Promise<ApiResponse<GetRoundResponse>> {
+    const endpoint = difficulty ? `/get-round?difficulty=${difficulty}` : '/get-round';
+    const result = await this.request<GetRoundResponse>(endpoint);
     
     if (result.data && !Array.isArray(result.data)) {
       return { error: 'Invalid response format' };
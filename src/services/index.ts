@@ -1,3 +1,4 @@
 export { apiService } from './api';
 export { prefetchService } from './prefetchService';
+export { roundSchedule } from './roundSchedule';
 
@@ -1,11 +1,16 @@
 import { prefetchService } from './prefetchService';
 import { apiService } from './api';
+import { roundSchedule } from './roundSchedule';
 import { Character } from '../components/CharacterCard/CharacterCard.types';
 
 // Mock the API service
 jest.mock('./api');
 const mockApiService = apiService as jest.Mocked<typeof apiService>;
 
+// Mock the static round schedule
+jest.mock('./roundSchedule');
+const mockRoundSchedule = roundSchedule as jest.Mocked<typeof roundSchedule>;
+
 // Mock Image constructor to resolve immediately
 const mockImage = {
   onload: null as (() => void) | null,
@@ -43,6 +48,7 @@ describe('PrefetchService - Simple Tests', () => {
   beforeEach(() => {
     jest.clearAllMocks();
     prefetchService.clearCache();
+    mockRoundSchedule.nextRound.mockResolvedValue(null);
     mockImage.onload = null;
     mockImage.onerror = null;
     mockImage.src = '';
@@ -89,6 +95,15 @@ describe('PrefetchService - Simple Tests', () => {
       expect(result).toBeNull();
     });
 
+    it('should use a pre-generated round before asking the API', async () => {
+      mockRoundSchedule.nextRound.mockResolvedValue(mockCharacters);
+
+      const result = await prefetchService.prefetchNextRound();
+
+      expect(result).toEqual(mockCharacters);
+      expect(mockApiService.getRound).not.toHaveBeenCalled();
+    });
+
     it('should handle API errors gracefully', async () => {
       mockApiService.getRound.mockResolvedValue({ error: 'API Error' });
 
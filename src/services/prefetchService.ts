@@ -1,5 +1,7 @@
 import { Character } from '../components/CharacterCard/CharacterCard.types';
 import { apiService } from './api';
+import { roundSchedule } from './roundSchedule';
+import { getImageSrc } from '../utils/gameLogic';
 
 interface PrefetchCache {
   characters: Character[] | null;
@@ -71,14 +73,8 @@ class PrefetchService {
 
   private async performPrefetch(): Promise<Character[]> {
     try {
-      // Fetch character data
-      const result = await apiService.getRound();
-      
-      if (result.error || !result.data) {
-        throw new Error(result.error || 'Failed to fetch characters');
-      }
-
-      const characters = result.data;
+      // Take the next pre-generated round, or ask the API if there is none
+      const characters = await roundSchedule.nextRound() ?? await this.fetchRound();
       
       // Prefetch images
       await this.prefetchImages(characters);
@@ -97,10 +93,20 @@ class PrefetchService {
     }
   }
 
+  private async fetchRound(): Promise<Character[]> {
+    const result = await apiService.getRound();
+
+    if (result.error || !result.data) {
+      throw new Error(result.error || 'Failed to fetch characters');
+    }
+    return result.data;
+  }
+
   private async prefetchImages(characters: Character[]): Promise<void> {
     const imagePromises = characters
-      .filter(char => char.image_url)
-      .map(char => this.prefetchImage(char.image_url!));
+      .map(char => getImageSrc(char))
+      .filter((url): url is string => url !== null)
+      .map(url => this.prefetchImage(url));
 
     if (imagePromises.length === 0) {
       return;
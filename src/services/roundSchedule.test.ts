@@ -0,0 +1,62 @@
+import { expandShard, roundSchedule } from './roundSchedule';
+import { RoundManifest, RoundShard } from '../shared/types';
+
+// Mock fetch
+const mockFetch = global.fetch as jest.MockedFunction<typeof fetch>;
+
+const respond = (body: unknown) => ({ ok: true, json: async () => body } as Response);
+
+describe('roundSchedule', () => {
+  const shard: RoundShard = {
+    characters: [
+      { id: 1, name: 'test_character_1', post_count: 1000, image_url: 'https://example.com/image1.jpg' },
+      { id: 2, name: 'test_character_2', post_count: 2000, image_url: 'https://example.com/image2.jpg' },
+      { id: 3, name: 'test_character_3', post_count: 3000, image_url: null },
+    ],
+    rounds: [[0, 1], [2, 0]],
+  };
+
+  const manifest: RoundManifest = {
+    generated_at: '2026-10-17T00:00:00+00:00',
+    shard_size: 2,
+    daily: {},
+    endless: { any: ['endless/any/0.abc.json'] },
+  };
+
+  beforeEach(() => {
+    jest.clearAllMocks();
+    roundSchedule.reset();
+  });
+
+  it('should expand index pairs into rounds of two characters', () => {
+    expect(expandShard(shard)).toEqual([
+      [shard.characters[0], shard.characters[1]],
+      [shard.characters[2], shard.characters[0]],
+    ]);
+  });
+
+  it('should serve the rounds of one shard in order', async () => {
+    mockFetch.mockResolvedValueOnce(respond(manifest)).mockResolvedValueOnce(respond(shard));
+
+    expect(await roundSchedule.nextRound()).toEqual([shard.characters[0], shard.characters[1]]);
+    expect(await roundSchedule.nextRound()).toEqual([shard.characters[2], shard.characters[0]]);
+    expect(mockFetch).toHaveBeenCalledWith('/rounds/manifest.json');
+    expect(mockFetch).toHaveBeenCalledWith('/rounds/endless/any/0.abc.json');
+    expect(mockFetch).toHaveBeenCalledTimes(2);
+  });
+
+  it('should return null when no rounds were exported', async () => {
+    mockFetch.mockResolvedValueOnce({ ok: false, status: 404 } as Response);
+
+    expect(await roundSchedule.nextRound()).toBeNull();
+    // The missing manifest is remembered for the session
+    expect(await roundSchedule.nextRound()).toBeNull();
+    expect(mockFetch).toHaveBeenCalledTimes(1);
+  });
+
+  it('should return null when a shard fails to load', async () => {
+    mockFetch.mockResolvedValueOnce(respond(manifest)).mockRejectedValueOnce(new Error('Network error'));
+
+    expect(await roundSchedule.nextRound()).toBeNull();
+  });
+});
@@ -0,0 +1,83 @@
+import { Character } from '../components/CharacterCard/CharacterCard.types';
+import { RoundManifest, RoundShard } from '../shared/types';
+
+// Static round sequences written by scripts/export_rounds.py
+const ROUNDS_BASE_URL = '/rounds';
+const ENDLESS_POOL = 'any';
+
+/**
+ * Turn a shard's index pairs back into rounds of two characters
+ */
+export const expandShard = (shard: RoundShard): Character[][] =>
+  shard.rounds.map(([a, b]) => [shard.characters[a], shard.characters[b]]);
+
+class RoundScheduleService {
+  private manifest: Promise<RoundManifest | null> | null = null;
+  private queue: Character[][] = [];
+  private usedShards = new Set<string>();
+
+  /**
+   * Next round from a pre-generated shard, or null when none are available
+   * (not exported, or the request failed) and the API should be used instead
+   */
+  async nextRound(): Promise<Character[] | null> {
+    if (this.queue.length === 0) {
+      await this.loadShard();
+    }
+    return this.queue.shift() ?? null;
+  }
+
+  /**
+   * Forget the manifest and any queued rounds
+   */
+  reset(): void {
+    this.manifest = null;
+    this.queue = [];
+    this.usedShards.clear();
+  }
+
+  private async loadShard(): Promise<void> {
+    const manifest = await this.getManifest();
+    const shards = manifest?.endless[ENDLESS_POOL] ?? [];
+    if (shards.length === 0) {
+      return;
+    }
+
+    // A random shard not played yet this session, then start over
+    let unused = shards.filter(path => !this.usedShards.has(path));
+    if (unused.length === 0) {
+      this.usedShards.clear();
+      unused = shards;
+    }
+    const path = unused[Math.floor(Math.random() * unused.length)];
+
+    const shard = await this.fetchJson<RoundShard>(path);
+    if (shard) {
+      this.usedShards.add(path);
+      this.queue = expandShard(shard);
+    }
+  }
+
+  private getManifest(): Promise<RoundManifest | null> {
+    // Fetched once per session; a missing manifest means rounds come from the API
+    if (!this.manifest) {
+      this.manifest = this.fetchJson<RoundManifest>('manifest.json');
+    }
+    return this.manifest;
+  }
+
+  private async fetchJson<T>(path: string): Promise<T | null> {
+    try {
+      const response = await fetch(`${ROUNDS_BASE_URL}/${path}`);
+      if (!response.ok) {
+        return null;
+      }
+      return await response.json();
+    } catch (error) {
+      console.warn(`Round schedule unavailable (${path}):`, error);
+      return null;
+    }
+  }
+}
+
+export const roundSchedule = new RoundScheduleService();
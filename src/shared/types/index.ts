@@ -7,3 +7,23 @@ export interface ApiResponse<T> {
 }
 
 export type GetRoundResponse = Character[];
+
+// Round pools built by scripts/round_pairs.py, by post_count ratio
+export type Difficulty = 'easy' | 'medium' | 'hard';
+
+// Static round sequences written by scripts/export_rounds.py; shard paths
+// are relative to /rounds
+export interface RoundManifest {
+  generated_at: string;
+  shard_size: number;
+  daily: Record<string, string>;
+  endless: Record<string, string[]>;
+}
+
+// Each character once, rounds as index pairs into that list
+export interface RoundShard {
+  characters: Character[];
+  rounds: [number, number][];
+  date?: string;
+  difficulty?: string[];
+}
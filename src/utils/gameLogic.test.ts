@@ -4,6 +4,8 @@ import {
   formatCharacterName,
   formatPostCount,
   validateDifferentPostCounts,
+  getImageSrc,
+  getImageSources,
 } from './gameLogic';
 import { Character } from '../components/CharacterCard/CharacterCard.types';
 
@@ -171,4 +173,46 @@ describe('gameLogic', () => {
       expect(validateDifferentPostCounts(characters)).toBe(false);
     });
   });
+
+  describe('getImageSrc', () => {
+    it('should prefer the local derivative when present', () => {
+      const character = { ...mockCharacter1, local_image: '/images/derived/ab/cd/abcd_800.webp' };
+      expect(getImageSrc(character)).toBe('/images/derived/ab/cd/abcd_800.webp');
+    });
+
+    it('should fall back to the original image_url', () => {
+      expect(getImageSrc(mockCharacter1)).toBe('https://example.com/image1.jpg');
+      expect(getImageSrc({ ...mockCharacter1, local_image: null })).toBe('https://example.com/image1.jpg');
+    });
+
+    it('should return null when there is no image at all', () => {
+      expect(getImageSrc({ ...mockCharacter1, image_url: null })).toBeNull();
+    });
+  });
+
+  describe('getImageSources', () => {
+    it('should list the local image, the original and the fallbacks in order', () => {
+      const character = {
+        ...mockCharacter1,
+        local_image: '/images/derived/ab/cd/abcd_800.webp',
+        fallback_images: ['https://example.com/fallback1.jpg', 'https://example.com/fallback2.jpg'],
+      };
+      expect(getImageSources(character)).toEqual([
+        '/images/derived/ab/cd/abcd_800.webp',
+        'https://example.com/image1.jpg',
+        'https://example.com/fallback1.jpg',
+        'https://example.com/fallback2.jpg',
+      ]);
+    });
+
+    it('should skip missing and repeated images', () => {
+      const character = {
+        ...mockCharacter1,
+        image_url: null,
+        fallback_images: ['https://example.com/fallback1.jpg', 'https://example.com/fallback1.jpg'],
+      };
+      expect(getImageSources(character)).toEqual(['https://example.com/fallback1.jpg']);
+      expect(getImageSources({ ...mockCharacter1, image_url: null })).toEqual([]);
+    });
+  });
 });
@@ -58,3 +58,22 @@ export const validateDifferentPostCounts = (characters: Character[]): boolean =>
   return characters[0].post_count !== characters[1].post_count;
 };
 
+
+/**
+ * Picks the image a character card should load
+ * @param character - Character to get the image for
+ * @returns The locally served derivative when there is one, otherwise the original e621 URL
+ */
+export const getImageSrc = (character: Character): string | null => {
+  return character.local_image || character.image_url || null;
+};
+
+/**
+ * Lists every image a character card can try, in order
+ * @param character - Character to get the images for
+ * @returns getImageSrc's pick first, then the original URL and the stored fallback images, without repeats
+ */
+export const getImageSources = (character: Character): string[] => {
+  const sources = [character.local_image, character.image_url, ...(character.fallback_images ?? [])];
+  return Array.from(new Set(sources.filter((src): src is string => !!src)));
+};